@@ -1,11 +1,23 @@
 import os
 import sys
+import re
+import json
+import math
+import time
+import hashlib
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from typing import List, Dict, Any, TypedDict
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
-from sentence_transformers import SentenceTransformer
+from embeddings import get_reranker_model, embed_query
+from database import sql_str, two_stage_search, MULTI_VECTOR, SPANS_TABLE_NAME, BINARY_VECTOR_COLUMN
+from cache_store import LazyDiskCache
+from verdict_cache import get_verdict_cache, chunk_id, verdict_key, format_verdict_cache_stats
 import lancedb
+import numpy as np
 import pandas as pd
 from langgraph.graph import StateGraph, END
 
@@ -27,6 +39,441 @@ TABLE_NAME = "compliance_audit"
 LLM_MODEL = "mlx-community/Qwen2.5-72B-Instruct-4bit"
 BASE_URL = "http://localhost:8080/v1"
 
+MANIFEST_PATH = "data/manifest.json"
+READ_CONSISTENCY_SECONDS = 5
+RETRIEVAL_K = 8
+
+# Filter planner: prefilter when filters keep at most this share of chunks, else postfilter
+# over up to POSTFILTER_MAX_LIMIT ANN candidates.
+PREFILTER_MAX_SELECTIVITY = 0.3
+POSTFILTER_MAX_LIMIT = 64
+
+# Column projection for search results: everything the graph and app use except the vector and the
+# full table HTML (a TABLE_PREVIEW_CHARS prefix is projected instead for grading).
+RETRIEVAL_COLUMNS = [
+    "text", "ticker", "section", "page_number", "element_type", "bbox", "industry", "year",
+    "filing_type", "fiscal_period", "jurisdiction", "risk_flag", "cik", "source_pdf", "chunk_hash",
+]
+TABLE_PREVIEW_CHARS = 500
+
+# Retrieval mode: "hybrid" fuses BM25 (text, table_json) and vector ranks with reciprocal rank
+# fusion; "vector" is pure vector search. Each leg contributes up to HYBRID_CANDIDATES chunks.
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+FTS_COLUMNS = ["text", "table_json"]
+HYBRID_CANDIDATES = 20
+RRF_K = 60
+
+# ANN search tuning (only takes effect once database.ensure_vector_index has built an index).
+# Higher nprobes / refine_factor trade latency for recall; see scripts/benchmark_ann_recall.py.
+SEARCH_NPROBES = int(os.environ.get("SEARCH_NPROBES", "20"))
+SEARCH_REFINE_FACTOR = int(os.environ.get("SEARCH_REFINE_FACTOR", "5"))
+
+# Vector search mode: "float" searches the float32 vectors directly; "binary" runs the two-stage
+# search (hamming distance over the 1-bit codes for limit * BINARY_OVERSAMPLE candidates, then exact
+# L2 rescoring of those candidates' float vectors; see database.two_stage_search).
+# See scripts/benchmark_quantization.py for bytes scanned and recall@k against float32.
+VECTOR_SEARCH_MODE = os.environ.get("VECTOR_SEARCH_MODE", "float")
+BINARY_OVERSAMPLE = int(os.environ.get("BINARY_OVERSAMPLE", "10"))
+
+# Relevance grading: chunks are graded concurrently with at most GRADING_CONCURRENCY requests in
+# flight (match the inference server's batch capacity). Each grading request times out after
+# GRADING_TIMEOUT_SECONDS with no retry, so that is also the worst case per chunk; a chunk whose
+# grading call fails is kept rather than silently dropped.
+GRADING_CONCURRENCY = int(os.environ.get("GRADING_CONCURRENCY", "4"))
+GRADING_TIMEOUT_SECONDS = float(os.environ.get("GRADING_TIMEOUT_SECONDS", "60"))
+
+# Grading mode: "pointwise" sends one YES/NO prompt per chunk; "listwise" grades all chunks in a
+# single request answered with a JSON array of 0/1 verdicts (falls back to pointwise if the answer
+# does not parse). Output is capped at GRADING_MAX_TOKENS per verdict.
+GRADING_MODE = os.environ.get("GRADING_MODE", "pointwise")
+GRADING_MAX_TOKENS = 4
+# Version of the grading prompts in the persistent verdict cache key (bump when either prompt changes)
+GRADER_VERSION = "grader-v1"
+# Cache mode of the pointwise verdicts graded when a listwise answer does not parse
+LISTWISE_FALLBACK_MODE = "listwise-fallback"
+LISTWISE_VERDICT_RE = re.compile(r"\[\s*(?:[01]\s*(?:,\s*[01]\s*)*)?\]")
+
+# Cross-encoder pre-grading (rerank node): chunks scoring >= RERANK_ACCEPT_SCORE are accepted without
+# an LLM call, chunks below RERANK_REJECT_SCORE are dropped, and only the band in between is graded
+# by the LLM. Scores are relevance probabilities in [0, 1] (embeddings.get_reranker_model applies a
+# sigmoid to the cross-encoder logits). RERANK=0 disables the stage.
+RERANK_ENABLED = os.environ.get("RERANK", "1") == "1"
+RERANK_ACCEPT_SCORE = float(os.environ.get("RERANK_ACCEPT_SCORE", "0.9"))
+RERANK_REJECT_SCORE = float(os.environ.get("RERANK_REJECT_SCORE", "0.05"))
+TABLE_QUERY_KEYWORDS = ['table', 'tabular', 'calculate', 'difference', 'sum', 'total', 'accrual', 'revenue', 'expense']
+
+# Semantic answer cache: a question whose embedding is within ANSWER_CACHE_THRESHOLD cosine of a
+# previously answered one, under the same filters, returns the stored answer and evidence without
+# retrieval, grading or generation, provided both questions name the same numbers and entities
+# (see question_anchors). Entries are tied to the ingest timestamps of the filings in scope,
+# so re-ingesting or deleting any of them invalidates the answer. Set ANSWER_CACHE=0 to disable.
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_PATH = "data/cache/answers.sqlite"
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 3600 # Per answer (each entry's own created_at), not per scope
+ANSWER_CACHE_MAX_SCOPES = 1000 # LRU over filter scopes
+ANSWER_CACHE_PER_SCOPE = 50 # Most recent answers kept per filter scope
+# MiniLM embeds "revenue in 2022" and "revenue in 2023" almost identically, so a hit also requires the
+# question's numbers (years, amounts, quarters) and capitalized names (companies, tickers) to match exactly
+ANSWER_ANCHOR_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+ANSWER_ANCHOR_NAME_RE = re.compile(r"\b[A-Z][A-Za-z0-9&.'-]*")
+
+# Context packing for generate: sources are added best-first until CONTEXT_TOKEN_BUDGET prompt tokens
+# (see estimate_tokens) are used; table HTML is sent as tab-separated rows and bbox
+# coordinates are left out (the app highlights from the evidence metadata, not from the answer).
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "6000"))
+CHARS_PER_TOKEN = 3 # For characters other than digits and tab/newline separators (each counted as a token)
+MIN_PARTIAL_SOURCE_TOKENS = 150 # Below this, a source that doesn't fit is skipped rather than truncated
+
+# --- FILTER PLANNING ---
+# Manifest fields corresponding to each state filter (see pipeline.ingest_and_index)
+MANIFEST_FILTER_FIELDS = {
+    "ticker_filter": "ticker",
+    "industry_filter": "industry",
+    "year_filter": "year",
+    "filing_type_filter": "type",
+    "jurisdiction_filter": "jurisdiction",
+    "risk_only_filter": "risk_flag",
+}
+
+def load_manifest_documents():
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f).get("documents", [])
+    except (OSError, ValueError):
+        return []
+
+def match_manifest_documents(state, documents):
+    """
+    Returns the manifest entries that fall inside the state's filter scope.
+    """
+    matched = []
+    for doc in documents:
+        in_scope = True
+        for state_key, field in MANIFEST_FILTER_FIELDS.items():
+            wanted = state.get(state_key)
+            if not wanted:
+                continue
+            if state_key == "risk_only_filter":
+                in_scope = in_scope and bool(doc.get(field))
+            else:
+                in_scope = in_scope and doc.get(field) == wanted
+        if in_scope:
+            matched.append(doc)
+    return matched
+
+# Chunk counts of legacy manifest entries, valid for one table version (reset when the table changes)
+_legacy_chunk_counts = {"version": None, "counts": {}}
+
+def document_chunk_count(doc, table=None):
+    """
+    Chunk count of a manifest entry. Entries written before ingest recorded a count are counted
+    in the table (one indexed source_pdf lookup, memoized per table version) when it is given;
+    otherwise None, and they are left out.
+    """
+    if "chunks" in doc:
+        return doc["chunks"]
+    if table is None:
+        return None
+    version = table.version
+    if _legacy_chunk_counts["version"] != version:
+        _legacy_chunk_counts.update(version=version, counts={})
+    counts = _legacy_chunk_counts["counts"]
+    if doc["filename"] not in counts:
+        counts[doc["filename"]] = table.count_rows(f"source_pdf = {sql_str(doc['filename'])}")
+    return counts[doc["filename"]]
+
+# Rows without binary codes yet (stored before vector_bin), valid for one table version
+_uncoded_rows = {"version": None, "count": 0}
+
+def uncoded_row_count(table):
+    """
+    Rows whose vector_bin is still null (until maintain_indexes backfills them), memoized per table version.
+    """
+    version = table.version
+    if _uncoded_rows["version"] != version:
+        _uncoded_rows.update(version=version, count=table.count_rows(f"{BINARY_VECTOR_COLUMN} IS NULL"))
+    return _uncoded_rows["count"]
+
+def estimate_selectivity(state, table=None):
+    """
+    Fraction of indexed chunks the filters keep, estimated from manifest statistics
+    (per-document chunk counts, see document_chunk_count).
+    """
+    documents = load_manifest_documents()
+    counts = {id(doc): document_chunk_count(doc, table) for doc in documents}
+    counted = [doc for doc in documents if counts[id(doc)] is not None]
+    total = sum(counts[id(doc)] for doc in counted)
+    if not total:
+        return 1.0
+    matched = sum(counts[id(doc)] for doc in match_manifest_documents(state, counted))
+    return matched / total
+
+def plan_filter(selectivity, k):
+    """
+    Narrow filters prefilter (scalar indexes make the candidate set cheap and the search exact
+    over it); broad filters postfilter over a widened ANN candidate set instead.
+    Returns (prefilter, limit).
+    """
+    if selectivity <= PREFILTER_MAX_SELECTIVITY:
+        return True, k
+    limit = min(math.ceil(k / max(selectivity, 1e-6)), POSTFILTER_MAX_LIMIT)
+    return False, limit
+
+def is_table_query(question):
+    """
+    Table/calculation questions get lenient grading: chunks with tables are kept even when graded NO.
+    """
+    return any(kw in question.lower() for kw in TABLE_QUERY_KEYWORDS)
+
+def parse_pointwise_verdict(content):
+    """
+    Strict YES/NO parse: the answer must open with YES or NO. Returns True, False, or None when
+    it does neither (so "NO ... YES" is a NO, not a match on the later YES).
+    """
+    match = re.match(r"^\W*(YES|NO)\b", content.strip().upper())
+    if not match:
+        return None
+    return match.group(1) == "YES"
+
+def parse_listwise_verdicts(content, count):
+    """
+    Strict parse of a listwise answer: exactly a JSON array of count 0/1 values and nothing else.
+    Returns a list of booleans, or None if the answer does not conform.
+    """
+    content = content.strip()
+    if not LISTWISE_VERDICT_RE.fullmatch(content):
+        return None
+    verdicts = json.loads(content)
+    if len(verdicts) != count:
+        return None
+    return [v == 1 for v in verdicts]
+
+# --- CONTEXT PACKING ---
+class _TableTextParser(HTMLParser):
+    """Collects the cell text of an HTML table, row by row."""
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._row = []
+        elif tag in ("td", "th"):
+            self._cell = []
+        elif tag == "br" and self._cell is not None:
+            self._cell.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            if self._row is None:
+                self._row = []
+            self._row.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if any(self._row):
+                self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+def html_table_to_tsv(html):
+    """
+    Compact table serialization: one line per row, cells separated by tabs, markup and empty
+    rows dropped. Falls back to the tag-stripped text when the HTML has no rows.
+    """
+    parser = _TableTextParser()
+    parser.feed(html)
+    parser.close()
+    if not parser.rows:
+        return " ".join(re.sub(r"<[^>]+>", " ", html).split())
+    return "\n".join("\t".join(row) for row in parser.rows)
+
+def _is_token_char(ch):
+    # Qwen's tokenizer splits numbers into single digits, and TSV separators rarely merge with
+    # their neighbours, so each of these is costed as a whole token
+    return ch.isdigit() or ch == "\t" or ch == "\n"
+
+def estimate_tokens(text):
+    """
+    Conservative prompt-token estimate (over- rather than under-counts, also for numeric tables):
+    one token per digit, tab and newline, plus CHARS_PER_TOKEN characters per token for the rest.
+    """
+    whole = sum(1 for ch in text if _is_token_char(ch))
+    return whole + math.ceil((len(text) - whole) / CHARS_PER_TOKEN)
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Longest prefix of text whose estimate_tokens is at most max_tokens.
+    """
+    whole = other = 0
+    for i, ch in enumerate(text):
+        if _is_token_char(ch):
+            whole += 1
+        else:
+            other += 1
+        if whole + math.ceil(other / CHARS_PER_TOKEN) > max_tokens:
+            return text[:i]
+    return text
+
+def relevance_rank(documents):
+    """
+    Indices of documents, most relevant first: cross-encoder score, then fused (RRF) score,
+    then vector distance; retrieval order breaks ties.
+    """
+    def key(i):
+        doc = documents[i]
+        return (
+            -doc.get("_rerank_score", float("-inf")),
+            -doc.get("_relevance_score", float("-inf")),
+            doc.get("_distance", float("inf")),
+            i,
+        )
+    return sorted(range(len(documents)), key=key)
+
+def format_source(i, doc, table_text=None):
+    block = f"\n[Source {i+1} - Page {doc['page_number']}]:\n{doc['text']}\n"
+    if table_text:
+        block += f"Table Data (tab-separated):\n{table_text}\n"
+    return block
+
+def pack_context(documents, budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Builds the generation context within a token budget. Sources are admitted by relevance rank,
+    the last one truncated if enough budget remains, but emitted in document order so that
+    [Source N] keeps matching the Nth evidence entry. Returns (context, stats).
+    """
+    blocks = {}
+    used = 0
+    truncated = 0
+    for i in relevance_rank(documents):
+        doc = documents[i]
+        table_text = html_table_to_tsv(doc["table_json"]) if doc.get("table_json") else ""
+        block = format_source(i, doc, table_text)
+        cost = estimate_tokens(block)
+        remaining = budget - used
+        if cost > remaining:
+            if remaining < MIN_PARTIAL_SOURCE_TOKENS:
+                continue
+            marker = " [...]\n"
+            block = truncate_to_tokens(block, remaining - estimate_tokens(marker)).rstrip() + marker
+            cost = estimate_tokens(block)
+            truncated += 1
+        blocks[i] = block
+        used += cost
+
+    # What the unpacked prompt would have cost: full text, raw HTML and coordinates for every source
+    unpacked = 0
+    for i, doc in enumerate(documents):
+        raw = f"\n[Source {i+1} - Page {doc['page_number']}]:\n{doc['text']}\n"
+        if doc.get("table_json"):
+            raw += f"Table Data (HTML): {doc['table_json']}\n"
+        if doc.get("bbox"):
+            raw += f"Coordinates: {doc['bbox']}\n"
+        unpacked += estimate_tokens(raw)
+
+    context = "".join(blocks[i] for i in sorted(blocks))
+    stats = {
+        "sources": len(documents),
+        "kept": len(blocks),
+        "truncated": truncated,
+        "tokens": used,
+        "unpacked_tokens": unpacked,
+    }
+    return context, stats
+
+# --- ANSWER CACHE ---
+_answer_cache = LazyDiskCache(ANSWER_CACHE_PATH, ANSWER_CACHE_MAX_SCOPES, ttl_seconds=ANSWER_CACHE_TTL_SECONDS)
+
+def get_answer_cache():
+    """
+    Returns the shared on-disk answer cache (opened lazily), or None when disabled.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    return _answer_cache.get()
+
+def answer_scope_key(state):
+    """
+    Cache key for the state's filter tuple; answers are only reused under identical filters.
+    """
+    scope = [state.get(state_key) or "" for state_key in MANIFEST_FILTER_FIELDS]
+    return "answers:" + hashlib.sha256(json.dumps(scope, default=str).encode("utf-8")).hexdigest()
+
+def scope_fingerprint(state):
+    """
+    Hash of (filename, ingested_at) for every manifest document in the state's filter scope.
+    Changes whenever a filing in scope is re-ingested, added or deleted.
+    """
+    documents = match_manifest_documents(state, load_manifest_documents())
+    stamps = sorted((doc.get("filename", ""), doc.get("ingested_at", "")) for doc in documents)
+    return hashlib.sha256(json.dumps(stamps).encode("utf-8")).hexdigest()
+
+def grader_id(mode):
+    """
+    Identifies the grader (model, grading mode, prompt version) in the persistent verdict cache.
+    Verdicts of one mode never answer another's lookups. Pointwise verdicts graded as the fallback of
+    an unparseable listwise answer are stored under LISTWISE_FALLBACK_MODE, which only listwise reads.
+    """
+    return f"{LLM_MODEL}:{mode}:{GRADER_VERSION}"
+
+def question_anchors(question):
+    """
+    Tokens two questions must share for one's cached answer to serve the other: numbers (thousands
+    separators dropped) and capitalized words after the first one, compared case-insensitively.
+    """
+    numbers = {n.replace(",", "") for n in ANSWER_ANCHOR_NUMBER_RE.findall(question)}
+    rest = question.strip().split(None, 1)
+    names = {n.rstrip(".'").lower() for n in ANSWER_ANCHOR_NAME_RE.findall(rest[1] if len(rest) > 1 else "")}
+    return numbers | names
+
+def live_answer_entries(entries, fingerprint, now=None):
+    """
+    Cached answers still usable: within ANSWER_CACHE_TTL_SECONDS of their own creation and
+    computed over the current versions of the filings in scope.
+    """
+    now = time.time() if now is None else now
+    return [
+        e for e in entries
+        if e["fingerprint"] == fingerprint and now - e.get("created_at", 0) <= ANSWER_CACHE_TTL_SECONDS
+    ]
+
+def _json_default(value):
+    # numpy scalars (page numbers, distances) coming out of LanceDB results
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+def chunk_key(doc):
+    """
+    Stable identity of a retrieved chunk across search legs (matches database.UPSERT_KEY).
+    Rows indexed before chunk hashes existed fall back to their text.
+    """
+    return (doc.get("source_pdf", ""), doc.get("page_number", 0), doc.get("chunk_hash") or doc.get("text", ""))
+
+def rrf_fuse(ranked_lists, k=RRF_K):
+    """
+    Reciprocal rank fusion: score(d) = sum over lists of 1 / (k + rank). Returns unique docs,
+    best first, each annotated with its fused '_relevance_score'.
+    """
+    scores = {}
+    docs = {}
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked, start=1):
+            key = chunk_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    fused = []
+    for key in sorted(scores, key=scores.get, reverse=True):
+        doc = dict(docs[key])
+        doc["_relevance_score"] = scores[key]
+        fused.append(doc)
+    return fused
+
 # --- STATE DEFINITION ---
 class AgentState(TypedDict):
     question: str
@@ -39,6 +486,7 @@ class AgentState(TypedDict):
     filing_type_filter: str # New: filter by filing type
     jurisdiction_filter: str # New: filter by jurisdiction
     risk_only_filter: bool # New: filter for risk-flagged entries
+    cache_hit: bool # Set by check_cache: answer served from the semantic answer cache
 
 # --- NODES ---
 
@@ -52,10 +500,20 @@ class AuditorAgent:
                 openai_api_key="not-needed",
                 temperature=0.1
             )
+            # Grading calls get their own client with a hard request timeout and no retries
+            self.grader_llm = ChatOpenAI(
+                model=LLM_MODEL,
+                openai_api_base=BASE_URL,
+                openai_api_key="not-needed",
+                temperature=0.1,
+                timeout=GRADING_TIMEOUT_SECONDS,
+                max_retries=0
+            )
             log("ChatOpenAI initialized.")
-            self.embed_model = SentenceTransformer('all-MiniLM-L6-v2')
-            log("Embedding model loaded.")
-            self.db = lancedb.connect(DB_PATH)
+            # Re-check the latest dataset version periodically so long-lived sessions follow
+            # new ingests and never pin a version that maintenance has since pruned
+            self.db = lancedb.connect(DB_PATH, read_consistency_interval=timedelta(seconds=READ_CONSISTENCY_SECONDS))
+            self.spans_table = None
             if TABLE_NAME in self.db.table_names():
                 self.table = self.db.open_table(TABLE_NAME)
                 log("Database table connected.")
@@ -66,6 +524,70 @@ class AuditorAgent:
             log(f"FAILED TO INITIALIZE AGENT: {e}")
             # We don't raise here, we allow the agent to exist in a deferred state
             self.table = None
+            self.spans_table = None
+
+    def check_cache(self, state: AgentState):
+        """
+        Entry node: serves the answer from the semantic answer cache when a close enough question
+        was already answered under the same filters and the filings in scope are unchanged.
+        """
+        cache = get_answer_cache()
+        if cache is None:
+            return {"cache_hit": False}
+        start = time.time()
+        entries = live_answer_entries(json.loads(cache.get(answer_scope_key(state)) or "[]"), scope_fingerprint(state))
+        query_vector = embed_query(state["question"])
+        query_vector = query_vector / max(np.linalg.norm(query_vector), 1e-12)
+
+        anchors = question_anchors(state["question"])
+        best, best_score = None, -1.0
+        for entry in entries:
+            if question_anchors(entry["question"]) != anchors:
+                continue
+            score = float(np.dot(query_vector, np.asarray(entry["embedding"], dtype=np.float32)))
+            if score > best_score:
+                best, best_score = entry, score
+        if best is None or best_score < ANSWER_CACHE_THRESHOLD:
+            log(f"Answer cache miss ({len(entries)} entries in scope, best similarity {max(best_score, 0):.3f})")
+            return {"cache_hit": False}
+
+        log(f"Answer cache hit: '{best['question']}' (similarity {best_score:.3f}) in {(time.time() - start) * 1000:.0f}ms")
+        return {"cache_hit": True, "generation": best["generation"], "documents": best["documents"]}
+
+    def route_after_cache(self, state: AgentState):
+        return "hit" if state.get("cache_hit") else "miss"
+
+    def cache_answer(self, state: AgentState):
+        """
+        Stores the generated answer and its evidence for later semantically similar questions.
+        Expired entries and entries whose filings have changed since are dropped from the scope
+        on write; the read-modify-write is one cache transaction, so concurrent sessions don't
+        lose each other's answers.
+        """
+        cache = get_answer_cache()
+        if cache is None or not state.get("documents"):
+            return {}
+        key = answer_scope_key(state)
+        fingerprint = scope_fingerprint(state)
+        query_vector = embed_query(state["question"])
+        query_vector = query_vector / max(np.linalg.norm(query_vector), 1e-12)
+
+        entry = {
+            "question": state["question"],
+            "embedding": query_vector.tolist(),
+            "fingerprint": fingerprint,
+            "generation": state["generation"],
+            "documents": state["documents"],
+            "created_at": time.time(),
+        }
+
+        def append_entry(current):
+            entries = live_answer_entries(json.loads(current or "[]"), fingerprint, now=entry["created_at"])
+            entries.append(entry)
+            return json.dumps(entries[-ANSWER_CACHE_PER_SCOPE:], default=_json_default)
+
+        cache.update(key, append_entry)
+        return {}
 
     def retrieve(self, state: AgentState):
         t = state.get('ticker_filter', 'NONE')
@@ -84,11 +606,182 @@ class AuditorAgent:
                 log("RETRIEVAL FAILED: No compliance audit table found in vault.")
                 return {"documents": [], "iterations": state.get("iterations", 0) + 1}
 
-        query_vector = self.embed_model.encode(state['question'])
+        query_vector = embed_query(state['question'])
         
-        # Build search query with hierarchical filters
-        search_query = self.table.search(query_vector).limit(8)
+        # Build filter conditions, then let the planner pick prefilter vs postfilter
+        where_clause = self._build_where_clause(state)
+        limit = RETRIEVAL_K
+        prefilter = True
+        if where_clause:
+            selectivity = estimate_selectivity(state, self.table)
+            prefilter, limit = plan_filter(selectivity, RETRIEVAL_K)
+            log(f"Filter plan: selectivity ~{selectivity:.1%} -> {'prefilter' if prefilter else 'postfilter'} (limit {limit})")
         
+        # Vector leg (widened to the fusion candidate pool in hybrid mode)
+        hybrid = RETRIEVAL_MODE == "hybrid"
+        vector_limit = max(limit, HYBRID_CANDIDATES) if hybrid else limit
+        if VECTOR_SEARCH_MODE == "binary" and BINARY_VECTOR_COLUMN in self.table.schema.names:
+            vector_docs = self._binary_search(query_vector, vector_limit, where_clause, prefilter)
+        else:
+            search_query = (
+                self.table.search(query_vector)
+                .limit(vector_limit)
+                .nprobes(SEARCH_NPROBES)
+                .refine_factor(SEARCH_REFINE_FACTOR)
+                .select(self._projection())
+            )
+            
+            # Apply combined filters if any exist
+            if where_clause:
+                search_query = search_query.where(where_clause, prefilter=prefilter)
+                
+            vector_docs = search_query.to_pandas().to_dict(orient="records")
+        spans_table = self._open_spans_table()
+        if spans_table is not None:
+            vector_docs = self._max_sim(spans_table, query_vector, vector_docs, vector_limit, where_clause, prefilter)
+        if not hybrid:
+            return {"documents": vector_docs[:RETRIEVAL_K], "iterations": state.get("iterations", 0) + 1}
+
+        # Lexical legs: BM25 over text and table_json, fused with the vector ranking
+        ranked_lists = [vector_docs]
+        for column in FTS_COLUMNS:
+            ranked_lists.append(self._full_text_search(state["question"], column, where_clause))
+        documents = rrf_fuse(ranked_lists)[:RETRIEVAL_K]
+        log(f"Hybrid retrieval: fused {', '.join(str(len(r)) for r in ranked_lists)} candidates (vector, {', '.join(FTS_COLUMNS)})")
+        return {"documents": documents, "iterations": state.get("iterations", 0) + 1}
+
+    def _binary_search(self, query_vector, limit, where_clause, prefilter):
+        """
+        Two-stage vector search over the binary codes with exact rescoring. Rows not yet given
+        codes are searched on their float vectors alongside, so none drop out of retrieval.
+        """
+        uncoded = uncoded_row_count(self.table)
+        docs = two_stage_search(
+            self.table, query_vector, limit, BINARY_OVERSAMPLE,
+            projection=self._projection(), where_clause=where_clause, prefilter=prefilter,
+            nprobes=SEARCH_NPROBES, include_uncoded=uncoded > 0,
+        )
+        log(f"Binary search: rescored up to {limit * BINARY_OVERSAMPLE} candidates" + (f" (+{uncoded} rows without codes)" if uncoded else ""))
+        return docs.to_dict(orient="records")
+
+    def _open_spans_table(self):
+        """
+        The sub-span vector table (multi-vector mode), opened once it exists; None when disabled.
+        """
+        if not MULTI_VECTOR:
+            return None
+        if self.spans_table is None and SPANS_TABLE_NAME in self.db.table_names():
+            self.spans_table = self.db.open_table(SPANS_TABLE_NAME)
+        return self.spans_table
+
+    def _max_sim(self, spans_table, query_vector, vector_docs, limit, where_clause, prefilter):
+        """
+        Multi-vector scoring: a chunk's distance is the best of its own vector (its first token
+        window) and its sub-span vectors. Chunks reached only through a span are fetched by key,
+        so callers always get parent chunks (text, bbox, table preview).
+        """
+        query = (
+            spans_table.search(query_vector)
+            .limit(limit)
+            .nprobes(SEARCH_NPROBES)
+            .refine_factor(SEARCH_REFINE_FACTOR)
+            .select(["source_pdf", "page_number", "chunk_hash", "span_index"])
+        )
+        if where_clause:
+            query = query.where(where_clause, prefilter=prefilter)
+        spans = query.to_pandas().to_dict(orient="records")
+
+        best = {chunk_key(doc): (doc["_distance"], 0) for doc in vector_docs}
+        for span in spans:
+            key = chunk_key(span)
+            if key not in best or span["_distance"] < best[key][0]:
+                best[key] = (span["_distance"], span["span_index"])
+
+        parents = {chunk_key(doc): doc for doc in vector_docs}
+        missing = [key for key in best if key not in parents]
+        parents.update(self._fetch_chunks(missing))
+
+        documents = []
+        for key in sorted((k for k in best if k in parents), key=lambda k: best[k][0])[:limit]:
+            doc = dict(parents[key])
+            doc["_distance"], doc["_span_index"] = best[key]
+            documents.append(doc)
+        log(f"Multi-vector: {len(spans)} span hits, {len(missing)} parent chunks fetched")
+        return documents
+
+    def _fetch_chunks(self, keys, columns=None):
+        """
+        Looks up chunks by (source_pdf, page_number, chunk_hash) in one query. Returns {chunk_key: row}.
+        """
+        if not keys:
+            return {}
+        conditions = [
+            f"(source_pdf = {sql_str(source_pdf)} AND page_number = {int(page_number)} AND chunk_hash = {sql_str(chunk_hash)})"
+            for source_pdf, page_number, chunk_hash in keys
+        ]
+        rows = (
+            self.table.search()
+            .where(" OR ".join(conditions))
+            .select(columns or self._projection())
+            .limit(len(keys) * 2)
+            .to_pandas()
+            .to_dict(orient="records")
+        )
+        return {chunk_key(row): row for row in rows}
+
+    def _full_text_search(self, question, column, where_clause):
+        """
+        BM25 search over one FTS-indexed column. Returns [] if the column has no FTS index yet.
+        """
+        if column not in self.table.schema.names:
+            return []
+        try:
+            query = (
+                self.table.search(question, query_type="fts", fts_columns=column)
+                .limit(HYBRID_CANDIDATES)
+                .select(self._projection())
+            )
+            if where_clause:
+                query = query.where(where_clause, prefilter=True)
+            return query.to_pandas().to_dict(orient="records")
+        except Exception as e:
+            log(f"Full-text search on '{column}' unavailable: {e}")
+            return []
+
+    def _projection(self):
+        """
+        Columns materialized by search: never the vector, and only a short preview of table_json.
+        Full table HTML is fetched later, for graded-relevant chunks only (see _hydrate_tables).
+        """
+        available_columns = self.table.schema.names
+        projection = {col: col for col in RETRIEVAL_COLUMNS if col in available_columns}
+        if "table_json" in available_columns:
+            projection["table_preview"] = f"left(table_json, {TABLE_PREVIEW_CHARS})"
+        return projection
+
+    def _hydrate_tables(self, documents):
+        """
+        Replaces table previews with the full table_json for the given documents, in one lookup.
+        """
+        wanted = [chunk_key(doc) for doc in documents if doc.get("table_preview") and doc.get("chunk_hash")]
+        if wanted and self.table is not None:
+            rows = self._fetch_chunks(wanted, ["source_pdf", "page_number", "chunk_hash", "table_json"])
+            full_tables = {key: row["table_json"] for key, row in rows.items()}
+            log(f"Hydrated full table_json for {len(full_tables)} of {len(documents)} graded chunks")
+        else:
+            full_tables = {}
+
+        hydrated = []
+        for doc in documents:
+            doc = dict(doc)
+            preview = doc.pop("table_preview", "")
+            if "table_json" not in doc:
+                # Legacy rows without a chunk hash keep the preview rather than nothing
+                doc["table_json"] = full_tables.get(chunk_key(doc), preview or "")
+            hydrated.append(doc)
+        return hydrated
+
+    def _build_where_clause(self, state: AgentState):
         # Get available columns from the database schema to prevent errors on old DBs
         available_columns = self.table.schema.names
         
@@ -106,14 +799,176 @@ class AuditorAgent:
             filters.append(f"jurisdiction = '{state['jurisdiction_filter']}'")
         if state.get("risk_only_filter") and "risk_flag" in available_columns:
             filters.append("risk_flag = true")
+        return " AND ".join(filters)
+
+    def _table_preview(self, doc):
+        return doc.get('table_preview') or doc.get('table_json', '')[:TABLE_PREVIEW_CHARS]
+
+    def _grade_chunk(self, question, doc):
+        """
+        One relevance-grading call for one chunk. Returns the grader's raw answer.
+        """
+        # Include table data in grading context if available
+        table_context = ""
+        table_preview = self._table_preview(doc)
+        if table_preview:
+            table_context = f"\nTABLE DATA: {table_preview}..."
         
-        # Apply combined filters if any exist
-        if filters:
-            search_query = search_query.where(" AND ".join(filters))
-            
-        results = search_query.to_pandas()
-        documents = results.to_dict(orient="records")
-        return {"documents": documents, "iterations": state.get("iterations", 0) + 1}
+        prompt = f"""You are a senior compliance grader. 
+        Evaluate if the following document chunk is RELEVANT to the auditor's question.
+        
+        AUDITOR QUESTION: {question}
+        DOCUMENT CONTEXT (Page {doc['page_number']}): {doc['text']}{table_context}
+        
+        RELEVANCE CRITERIA:
+        1. Does the text or table contain information that directly or indirectly addresses the question?
+        2. If the question asks about tabular data, financial figures, or calculations, consider if this chunk might contain the relevant table.
+        3. If the question mentions a specific page, does the context match that page?
+        
+        Be INCLUSIVE for table-related queries - if there's any chance the document contains relevant data, answer YES.
+        
+        Answer only with 'YES' or 'NO'.
+        """
+        res = self.grader_llm.invoke([HumanMessage(content=prompt)], max_tokens=GRADING_MAX_TOKENS)
+        return res.content.strip()
+
+    def _grade_pointwise(self, question, documents):
+        """
+        Grades each chunk with its own call, concurrently; verdicts come back in retrieval order.
+        Returns a list of True / False, or None where the grading call itself failed.
+        """
+        verdicts = []
+        with ThreadPoolExecutor(max_workers=max(1, min(GRADING_CONCURRENCY, len(documents))), thread_name_prefix="grader") as pool:
+            futures = [pool.submit(self._grade_chunk, question, doc) for doc in documents]
+            for i, future in enumerate(futures):
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    log(f"Grading Doc {i+1} failed ({e}); keeping it ungraded")
+                    verdicts.append(None)
+                    continue
+                verdict = parse_pointwise_verdict(answer)
+                log(f"Grading Doc {i+1}: {answer}" + ("" if verdict is not None else " (unparseable, treated as NO)"))
+                verdicts.append(bool(verdict))
+        return verdicts
+
+    def _grade_listwise(self, question, documents):
+        """
+        Grades every chunk in one request. Returns a list of booleans, or None if the call fails
+        or the answer is not exactly a JSON array with one 0/1 verdict per chunk.
+        """
+        chunks = ""
+        for i, doc in enumerate(documents):
+            table_preview = self._table_preview(doc)
+            table_context = f"\nTABLE DATA: {table_preview}..." if table_preview else ""
+            chunks += f"\n[{i+1}] (Page {doc['page_number']}): {doc['text']}{table_context}\n"
+
+        prompt = f"""You are a senior compliance grader.
+        Evaluate whether EACH numbered document chunk below is RELEVANT to the auditor's question.
+        
+        AUDITOR QUESTION: {question}
+        
+        DOCUMENT CHUNKS:{chunks}
+        RELEVANCE CRITERIA:
+        1. Does the text or table contain information that directly or indirectly addresses the question?
+        2. If the question asks about tabular data, financial figures, or calculations, consider if the chunk might contain the relevant table.
+        3. If the question mentions a specific page, does the chunk match that page?
+        
+        Be INCLUSIVE for table-related queries - if there's any chance a chunk contains relevant data, mark it 1.
+        
+        Answer ONLY with a JSON array of {len(documents)} numbers, one per chunk in order: 1 = relevant, 0 = not relevant.
+        Example for 3 chunks: [1,0,1]
+        """
+        try:
+            res = self.grader_llm.invoke([HumanMessage(content=prompt)], max_tokens=GRADING_MAX_TOKENS * len(documents) + 4)
+        except Exception as e:
+            log(f"Listwise grading failed ({e})")
+            return None
+        log(f"Listwise verdicts: {res.content.strip()}")
+        return parse_listwise_verdicts(res.content, len(documents))
+
+    def rerank(self, state: AgentState):
+        """
+        Cross-encoder pre-grading. Confident positives are marked accepted (no LLM call), clear
+        negatives are dropped, and the ambiguous band is left for grade_documents.
+        """
+        documents = state["documents"]
+        if not RERANK_ENABLED or not documents:
+            return {"documents": documents}
+        log("--- RERANKING DOCUMENTS ---")
+        question = state["question"]
+        try:
+            reranker = get_reranker_model()
+            pairs = [(question, doc["text"] + (f"\n{self._table_preview(doc)}" if self._table_preview(doc) else "")) for doc in documents]
+            start = time.time()
+            scores = reranker.predict(pairs, show_progress_bar=False)
+        except Exception as e:
+            log(f"Reranker unavailable ({e}); grading every chunk")
+            return {"documents": documents}
+
+        lenient = is_table_query(question)
+        kept = []
+        accepted = rejected = 0
+        for doc, score in zip(documents, scores):
+            doc = dict(doc)
+            doc["_rerank_score"] = float(score)
+            if score >= RERANK_ACCEPT_SCORE:
+                doc["_rerank_decision"] = "accept"
+                accepted += 1
+            elif score < RERANK_REJECT_SCORE:
+                if lenient and self._table_preview(doc):
+                    # Table leniency would keep this chunk whatever the LLM says, so skip the call
+                    doc["_rerank_decision"] = "accept"
+                    accepted += 1
+                else:
+                    rejected += 1
+                    continue
+            else:
+                doc["_rerank_decision"] = "grade"
+            kept.append(doc)
+
+        ambiguous = len(documents) - accepted - rejected
+        if GRADING_MODE == "listwise":
+            calls_avoided = int(ambiguous == 0)
+        else:
+            calls_avoided = accepted + rejected
+        log(
+            f"Rerank: {accepted} accepted, {rejected} rejected, {ambiguous} to LLM grading "
+            f"in {time.time() - start:.2f}s ({calls_avoided} LLM grading calls avoided)"
+        )
+        return {"documents": kept}
+
+    def _cached_verdicts(self, question, documents, mode):
+        """
+        Looks up stored verdicts for the documents in one query. Returns {id(doc): verdict} for hits.
+        """
+        cache = get_verdict_cache()
+        if cache is None:
+            return {}
+        keys = {}
+        for doc in documents:
+            chunk = chunk_id(doc)
+            if chunk:
+                keys[id(doc)] = verdict_key(question, chunk, grader_id(mode))
+        found = cache.get_many(list(set(keys.values())))
+        return {doc_id: found[key] == b"1" for doc_id, key in keys.items() if key in found}
+
+    def _store_verdicts(self, question, documents, verdicts, mode):
+        """
+        Persists fresh verdicts under the given cache mode (failed calls are not cached),
+        tagged by source filing for invalidation.
+        """
+        cache = get_verdict_cache()
+        if cache is None:
+            return
+        by_source = {}
+        for doc, verdict in zip(documents, verdicts):
+            chunk = chunk_id(doc)
+            if chunk and verdict is not None:
+                item = (verdict_key(question, chunk, grader_id(mode)), b"1" if verdict else b"0")
+                by_source.setdefault(doc.get("source_pdf", ""), []).append(item)
+        for source_pdf, items in by_source.items():
+            cache.put_many(items, tag=source_pdf)
 
     def grade_documents(self, state: AgentState):
         log("--- GRADING DOCUMENTS ---")
@@ -121,44 +976,49 @@ class AuditorAgent:
         documents = state["documents"]
         
         # Check if this is a table/calculation query (be more lenient)
-        table_keywords = ['table', 'tabular', 'calculate', 'difference', 'sum', 'total', 'accrual', 'revenue', 'expense']
-        is_table_query = any(kw in question.lower() for kw in table_keywords)
+        lenient = is_table_query(question)
         
+        # Chunks the reranker already accepted skip the LLM, as do chunks with a cached verdict
+        to_grade = [doc for doc in documents if doc.get("_rerank_decision") != "accept"]
+        mode = GRADING_MODE
+        graded = self._cached_verdicts(question, to_grade, mode)
+        misses = [doc for doc in to_grade if id(doc) not in graded]
+        if mode == "listwise" and misses:
+            # Verdicts of an earlier unparseable listwise answer were stored by the pointwise fallback
+            graded.update(self._cached_verdicts(question, misses, LISTWISE_FALLBACK_MODE))
+            misses = [doc for doc in misses if id(doc) not in graded]
+        start = time.time()
+        verdicts = None
+        cache_mode = mode
+        if mode == "listwise" and misses:
+            verdicts = self._grade_listwise(question, misses)
+            if verdicts is None:
+                log("Listwise answer did not parse; falling back to pointwise grading")
+                mode = "pointwise"
+                cache_mode = LISTWISE_FALLBACK_MODE
+        if verdicts is None:
+            verdicts = self._grade_pointwise(question, misses) if misses else []
+        self._store_verdicts(question, misses, verdicts, cache_mode)
+        graded.update({id(doc): verdict for doc, verdict in zip(misses, verdicts)})
         filtered_docs = []
         for i, doc in enumerate(documents):
-            log(f"Grading Doc {i+1}...")
-            
-            # Include table data in grading context if available
-            table_context = ""
-            if doc.get('table_json'):
-                table_context = f"\nTABLE DATA: {doc['table_json'][:500]}..."
-            
-            prompt = f"""You are a senior compliance grader. 
-            Evaluate if the following document chunk is RELEVANT to the auditor's question.
-            
-            AUDITOR QUESTION: {question}
-            DOCUMENT CONTEXT (Page {doc['page_number']}): {doc['text']}{table_context}
-            
-            RELEVANCE CRITERIA:
-            1. Does the text or table contain information that directly or indirectly addresses the question?
-            2. If the question asks about tabular data, financial figures, or calculations, consider if this chunk might contain the relevant table.
-            3. If the question mentions a specific page, does the context match that page?
-            
-            Be INCLUSIVE for table-related queries - if there's any chance the document contains relevant data, answer YES.
-            
-            Answer only with 'YES' or 'NO'.
-            """
-            res = self.llm.invoke([HumanMessage(content=prompt)])
-            log(f" Result: {res.content.strip()}")
-            
-            # For table queries, be more lenient - include docs with tables even if grader uncertain
-            if "YES" in res.content.upper():
+            if id(doc) not in graded:
                 filtered_docs.append(doc)
-            elif is_table_query and doc.get('table_json'):
-                log(" Including table doc due to table query leniency")
+                continue
+            verdict = graded[id(doc)]
+            # Failed calls keep the chunk; for table queries, be more lenient - include docs with tables even if grader uncertain
+            if verdict is None or verdict:
                 filtered_docs.append(doc)
+            elif lenient and self._table_preview(doc):
+                log(f" Including table doc {i+1} due to table query leniency")
+                filtered_docs.append(doc)
+        log(
+            f"Graded {len(misses)} of {len(documents)} chunks ({mode}) in {time.time() - start:.2f}s, "
+            f"{len(to_grade) - len(misses)} from cache, kept {len(filtered_docs)}"
+        )
+        log(format_verdict_cache_stats())
         
-        return {"documents": filtered_docs}
+        return {"documents": self._hydrate_tables(filtered_docs)}
 
 
     def generate(self, state: AgentState):
@@ -169,15 +1029,13 @@ class AuditorAgent:
         if not documents:
             return {"generation": "I'm sorry, I couldn't find relevant information in the provided SEC filings to answer your question accurately."}
 
-        context = ""
-        available_tables = []
-        for i, doc in enumerate(documents):
-            context += f"\n[Source {i+1} - Page {doc['page_number']}]:\n{doc['text']}\n"
-            if doc.get('table_json'):
-                context += f"Table Data (HTML): {doc['table_json']}\n"
-                available_tables.append(f"Page {doc['page_number']}")
-            if doc.get('bbox'):
-                context += f"Coordinates: {doc['bbox']}\n"
+        context, packing = pack_context(documents)
+        saved = packing["unpacked_tokens"] - packing["tokens"]
+        log(
+            f"Context packing: {packing['kept']}/{packing['sources']} sources ({packing['truncated']} truncated), "
+            f"~{packing['tokens']} prompt tokens vs ~{packing['unpacked_tokens']} unpacked "
+            f"(saved ~{saved}, {saved / max(packing['unpacked_tokens'], 1):.0%})"
+        )
 
         system_msg = """You are a Senior Financial Compliance Auditor with expertise in financial statement analysis.
         Your task is to answer user questions based ONLY on the provided context from SEC 10-K filings.
@@ -185,7 +1043,7 @@ class AuditorAgent:
         CRITICAL RULES:
         1. Accuracy is paramount. If the context doesn't contain the answer, say you don't know.
         2. Cite your sources using [Source X - Page Y].
-        3. If there is a bounding box (Coordinates) provided, include it in your citation to enable visual highlighting.
+        3. Cite the exact source and page numbers given in the context; visual highlighting is resolved from them automatically.
         4. Maintain a professional, objective tone.
 
         RISK FACTOR INTERPRETATION RULES:
@@ -195,7 +1053,7 @@ class AuditorAgent:
         - GENERICIZED ENTITIES: Corporations often omit specific names (e.g., "Midnight Blizzard") for generic terms ("nation-state actor"). Extract the *description of the actor* even if a proper noun is missing.
         
         TABULAR DATA & CALCULATION RULES:
-        - IMPORTANT: Table data may appear as inline text (e.g., "2025 Deferred tax assets 20,777") rather than HTML.
+        - IMPORTANT: Table data is given as tab-separated rows (first row usually the header), and may also appear as inline text (e.g., "2025 Deferred tax assets 20,777").
         - Parse numerical values from the text carefully. Look for patterns like "Year Label Amount" or "Category $ Amount".
         - Numbers following year labels (2024, 2025) or preceding text labels often represent financial figures in millions.
         - If asked to calculate differences, sums, or comparisons between years, PERFORM THE MATH explicitly.
@@ -212,12 +1070,22 @@ class AuditorAgent:
         
         prompt = f"Question: {question}\n\nContext:\n{context}"
         
-        res = self.llm.invoke([
+        # Stream the answer: with stream_mode="messages" LangGraph forwards each token to the caller
+        # (see app.py) while the full text is still returned as this node's update
+        start = time.time()
+        first_token_at = None
+        generation = ""
+        for chunk in self.llm.stream([
             SystemMessage(content=system_msg),
             HumanMessage(content=prompt)
-        ])
+        ]):
+            if first_token_at is None and chunk.content:
+                first_token_at = time.time()
+            generation += chunk.content
+        if first_token_at is not None:
+            log(f"Generation: first token after {first_token_at - start:.2f}s, complete after {time.time() - start:.2f}s")
         
-        return {"generation": res.content}
+        return {"generation": generation}
 
     def decide_to_generate(self, state: AgentState):
         return "generate"
@@ -227,13 +1095,19 @@ class AuditorAgent:
 def create_agent_graph():
     auditor = AuditorAgent()
     workflow = StateGraph(AgentState)
+    workflow.add_node("check_cache", auditor.check_cache)
     workflow.add_node("retrieve", auditor.retrieve)
+    workflow.add_node("rerank", auditor.rerank)
     workflow.add_node("grade_documents", auditor.grade_documents)
     workflow.add_node("generate", auditor.generate)
-    workflow.set_entry_point("retrieve")
-    workflow.add_edge("retrieve", "grade_documents")
+    workflow.add_node("cache_answer", auditor.cache_answer)
+    workflow.set_entry_point("check_cache")
+    workflow.add_conditional_edges("check_cache", auditor.route_after_cache, {"hit": END, "miss": "retrieve"})
+    workflow.add_edge("retrieve", "rerank")
+    workflow.add_edge("rerank", "grade_documents")
     workflow.add_conditional_edges("grade_documents", auditor.decide_to_generate, {"generate": "generate"})
-    workflow.add_edge("generate", END)
+    workflow.add_edge("generate", "cache_answer")
+    workflow.add_edge("cache_answer", END)
     return workflow.compile()
 
 if __name__ == "__main__":
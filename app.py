@@ -791,6 +791,10 @@ ICON_VAULT_LARGE = '''
 
 # --- INITIALIZATION ---
 from pipeline import load_manifest, ingest_and_index, purge_vault
+from maintenance import start_maintenance_scheduler
+
+# Background compaction/version cleanup (opt-in via MAINTENANCE_INTERVAL_MINUTES; one thread per process)
+start_maintenance_scheduler()
 
 if 'agent' not in st.session_state:
     with st.spinner("Initializing Sovereign Analysis Core..."):
@@ -894,7 +898,7 @@ with st.sidebar:
         ingest_method = st.radio("Source", ["Local PDF", "SEC EDGAR (Auto)"])
         
         if ingest_method == "Local PDF":
-            uploaded_file = st.file_uploader("Select PDF", type=["pdf"])
+            uploaded_file = st.file_uploader("Select Filing (PDF or EDGAR HTML)", type=["pdf", "htm", "html"])
             ticker = st.text_input("Ticker Symbol (e.g., AAPL)", "").upper()
             
             # Hierarchical Metadata Inputs
@@ -1120,6 +1124,18 @@ with col_f8:
 
 
 
+# De-duplicate evidence based on ticker, page, and text content
+def dedupe_evidence(documents):
+    seen = set()
+    deduped = []
+    for doc in documents:
+        # Create a unique key from ticker, page, and first 100 chars of text
+        key_str = f"{doc.get('ticker', '')}_{doc.get('page_number', 0)}_{doc.get('text', '')[:100]}"
+        if key_str not in seen:
+            seen.add(key_str)
+            deduped.append(doc)
+    return deduped
+
 # Financial Inquiry Input - With explicit submit button
 # Cancel callback function (must be defined before the button)
 def clear_query():
@@ -1173,30 +1189,56 @@ if query:
             }
         
             final_report = ""
+            streamed_report = ""
             evidence = []
             
+            # Progress messages go above the results tabs
+            progress_log = st.container()
+            
+            # --- RESULTS LAYOUT: DUAL-TAB FORENSIC VIEW ---
+            # Tabs are laid out before the graph runs so the conclusion can render while it is generated
+            tab_analysis, tab_evidence = st.tabs(["🏛️ Auditor Conclusion", "📂 Evidence Repository"])
+            
+            with tab_analysis:
+                st.markdown('<div class="report-card">', unsafe_allow_html=True)
+                header_conclusion = f'<div class="sidebar-header" style="color: var(--neutral-8); font-size: 1.25rem; margin-top: 0; margin-bottom: 1rem;">{ICON_FLOW} Analysis Summary</div>'
+                st.markdown(header_conclusion, unsafe_allow_html=True)
+                report_placeholder = st.empty()
+            
             # Progressive status messages
             status.update(label="Retrieving document context...", expanded=True)
             
-            for output in st.session_state.agent.stream(inputs):
-                for key, value in output.items():
-                    if key == "retrieve":
+            # "updates" carries each node's output, "messages" carries LLM tokens as they are decoded
+            for mode, payload in st.session_state.agent.stream(inputs, stream_mode=["updates", "messages"]):
+                if mode == "messages":
+                    token, metadata = payload
+                    # Grading calls also emit tokens; only the answer is rendered
+                    if metadata.get("langgraph_node") == "generate" and token.content:
+                        if not streamed_report:
+                            status.update(label="Streaming financial analysis...", expanded=True)
+                        streamed_report += token.content
+                        report_placeholder.markdown(streamed_report + "▌")
+                    continue
+                
+                for key, value in payload.items():
+                    if key == "check_cache":
+                        if value.get('cache_hit'):
+                            status.update(label="Answer served from cache...", expanded=True)
+                            progress_log.write(f"`CACHE: Substantiated answer reused ({len(value['documents'])} citations, filings in scope unchanged).`")
+                            evidence = dedupe_evidence(value['documents'])
+                            final_report = value['generation']
+                    elif key == "retrieve":
+                        status.update(label="Reranking evidence...", expanded=True)
+                        progress_log.write("`SUCCESS: Document-anchored context retrieved.`")
+                    elif key == "rerank":
                         status.update(label="Grading evidence relevance...", expanded=True)
-                        st.write("`SUCCESS: Document-anchored context retrieved.`")
+                        pre_accepted = sum(1 for doc in value['documents'] if doc.get('_rerank_decision') == 'accept')
+                        progress_log.write(f"`RERANK: {pre_accepted} pre-accepted, {len(value['documents']) - pre_accepted} sent to grading.`")
                     elif key == "grade_documents":
                         status.update(label="Synthesizing financial analysis...", expanded=True)
                         count = len(value['documents'])
-                        st.write(f"`VALIDATE: {count} specific citations substantiated.`")
-                        # De-duplicate evidence based on ticker, page, and text content
-                        seen = set()
-                        deduped = []
-                        for doc in value['documents']:
-                            # Create a unique key from ticker, page, and first 100 chars of text
-                            key_str = f"{doc.get('ticker', '')}_{doc.get('page_number', 0)}_{doc.get('text', '')[:100]}"
-                            if key_str not in seen:
-                                seen.add(key_str)
-                                deduped.append(doc)
-                        evidence = deduped
+                        progress_log.write(f"`VALIDATE: {count} specific citations substantiated.`")
+                        evidence = dedupe_evidence(value['documents'])
                     elif key == "generate":
                         status.update(label="Anchoring citations to source...", expanded=True)
                         final_report = value['generation']
@@ -1204,16 +1246,9 @@ if query:
             
             status.update(label="Compliance Chain Completed — Evidence anchored.", state="complete", expanded=True)
             
-            # --- RESULTS LAYOUT: DUAL-TAB FORENSIC VIEW ---
-            tab_analysis, tab_evidence = st.tabs(["🏛️ Auditor Conclusion", "📂 Evidence Repository"])
-            
             with tab_analysis:
-                st.markdown('<div class="report-card">', unsafe_allow_html=True)
-                header_conclusion = f'<div class="sidebar-header" style="color: var(--neutral-8); font-size: 1.25rem; margin-top: 0; margin-bottom: 1rem;">{ICON_FLOW} Analysis Summary</div>'
-                st.markdown(header_conclusion, unsafe_allow_html=True)
-                
                 if final_report:
-                    st.markdown(final_report)
+                    report_placeholder.markdown(final_report)
                     
                     # --- DRAFT REPORT BUILDER (Moved inside tab for context) ---
                     st.divider()
@@ -1324,7 +1359,9 @@ if query:
                                         pdf_path = candidate
                                         break
                             
-                            if pdf_path and os.path.exists(pdf_path):
+                            if pdf_path and not pdf_path.lower().endswith(".pdf"):
+                                st.info(f"Source is an HTML filing ({os.path.basename(pdf_path)}); page highlighting is only available for PDFs.")
+                            elif pdf_path and os.path.exists(pdf_path):
                                 render_pdf_viewer(
                                     pdf_path=pdf_path,
                                     page_number=citation['page_number'],
@@ -1377,11 +1414,10 @@ else:
     except:
         evidence_label = "OFFLINE"
     
-    # Get embedding dimension from model
+    # Get embedding dimension from the shared provider (no model load for known models)
     try:
-        from sentence_transformers import SentenceTransformer
-        embed_model = SentenceTransformer('all-MiniLM-L6-v2')
-        vector_dim = embed_model.get_sentence_embedding_dimension()
+        from embeddings import get_embedding_dimension
+        vector_dim = get_embedding_dimension()
         precision_label = f"{vector_dim} DIM"
     except:
         precision_label = "384 DIM"
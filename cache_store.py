@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+import time
+
+class DiskLRUCache:
+    """
+    Small SQLite-backed key/value store with LRU eviction, an entry cap, optional TTL and
+    tag-based invalidation. Safe to share across threads; WAL mode lets the Streamlit app
+    and the ingestion pipeline use the same file concurrently.
+    """
+
+    def __init__(self, path, max_entries, ttl_seconds=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB, tag TEXT, created_at REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON entries(last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tag ON entries(tag)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _is_expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get_many(self, keys):
+        """
+        Returns {key: value} for the keys present (and not expired); touches them for LRU.
+        """
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        expired = []
+        with self._lock:
+            # SQLite caps bound parameters, so look keys up in slices
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created_at FROM entries WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, value, created_at in rows:
+                    if self._is_expired(created_at, now):
+                        expired.append(key)
+                    else:
+                        found[key] = value
+            if found:
+                self._conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            if expired:
+                self._conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in expired])
+                self._size -= len(expired)
+            self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(set(keys)) - len(found)
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items, tag=None):
+        """
+        Stores (key, value) pairs, then evicts least-recently-used entries beyond max_entries.
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, tag, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                [(key, value, tag, now, now) for key, value in items]
+            )
+            self._size += len(items)
+            self._evict_overflow()
+            self._conn.commit()
+
+    def put(self, key, value, tag=None):
+        self.put_many([(key, value)], tag=tag)
+
+    def update(self, key, fn, tag=None):
+        """
+        Atomic read-modify-write: stores fn(current value or None) under key and returns it.
+        Runs in one IMMEDIATE transaction, so concurrent updates from other threads or processes
+        sharing the file are serialized instead of overwriting each other.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+                current = row[0] if row and not self._is_expired(row[1], now) else None
+                value = fn(current)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, tag, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, tag, now, now)
+                )
+                if row is None:
+                    self._size += 1
+                    self._evict_overflow()
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return value
+
+    def _evict_overflow(self):
+        # _size over-counts replaced keys; only pay for an exact count when we might be over the cap
+        if self._size > self.max_entries:
+            self._size = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self._size -= overflow
+
+    def invalidate_tag(self, tag):
+        """
+        Deletes every entry stored with the given tag. Returns the number removed.
+        """
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM entries WHERE tag = ?", (tag,)).rowcount
+            self._conn.commit()
+            self._size -= removed
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self._size = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": rate, "entries": self._size}
+
+class LazyDiskCache:
+    """
+    A DiskLRUCache opened on first use and shared by every caller; the file is only created
+    once something actually reads or writes it. Thread-safe.
+    """
+
+    def __init__(self, path, max_entries, ttl_seconds=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._cache = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = DiskLRUCache(self.path, self.max_entries, ttl_seconds=self.ttl_seconds)
+        return self._cache
@@ -1,18 +1,70 @@
 import lancedb
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from lancedb.pydantic import LanceModel, Vector
-from sentence_transformers import SentenceTransformer
 import json
 import os
+import time
+import math
+import hashlib
+import itertools
+from embeddings import get_embedding_model, get_embedding_dimension, encode_texts, format_embedding_cache_stats, normalize_text, token_windows, EMBEDDING_BACKEND
 
-# Initialize embedding model (runs on Metal/MPS on Mac)
+# Embedding model comes from the shared lazy provider in embeddings.py (runs on Metal/MPS on Mac).
 # 'all-MiniLM-L6-v2' is fast, 'all-mpnet-base-v2' is better but slower.
 # We'll use a middle ground for quality.
-print("Loading embedding model...")
-model = SentenceTransformer('all-MiniLM-L6-v2')
+EMBEDDING_DIM = get_embedding_dimension()
+
+TABLE_NAME = "compliance_audit"
+# Rows are upserted on this key, so re-indexing a filing replaces its chunks instead of duplicating them
+UPSERT_KEY = ["source_pdf", "page_number", "chunk_hash"]
+
+# ANN index lifecycle: build IVF_PQ once the table is big enough for brute force to hurt,
+# retrain when rows added since the last build exceed a fraction of the indexed rows.
+VECTOR_INDEX_MIN_ROWS = 50_000
+VECTOR_INDEX_RETRAIN_FRACTION = 0.25
+VECTOR_INDEX_TYPE = "IVF_PQ"
+VECTOR_INDEX_METRIC = "l2" # Matches the default metric of unindexed table.search()
+# Row count each table's vector index was last trained on. Table.optimize() folds new rows into the
+# existing index, so its unindexed-row count says nothing about how stale the centroids/codebooks are.
+VECTOR_INDEX_STATE_PATH = "data/vector_index_state.json"
+
+# 1-bit quantized copy of each chunk embedding (sign of every dimension, packed 8 per byte: 48 bytes
+# instead of 1,536 for 384 dims). Binary-mode retrieval searches these codes by hamming distance and
+# reads the float32 vector of the candidates only, for exact rescoring (see two_stage_search). A
+# coarse pass over the codes pages in 1/32 of the bytes; the codes add 1/32 to the table on disk.
+BINARY_VECTOR_COLUMN = "vector_bin"
+BINARY_INDEX_TYPE = "IVF_FLAT"
+BINARY_INDEX_METRIC = "hamming"
+# Rows per merge_insert when filling codes for rows stored before vector_bin existed
+BINARY_BACKFILL_BATCH = 10_000
+
+# Scalar indexes on the metadata columns AuditorAgent.retrieve filters on
+SCALAR_INDEX_COLUMNS = {
+    "ticker": "BITMAP",
+    "industry": "BITMAP",
+    "filing_type": "BITMAP",
+    "jurisdiction": "BITMAP",
+    "risk_flag": "BITMAP",
+    "year": "BTREE",
+    "source_pdf": "BTREE", # Stale-chunk deletes, delete_document and legacy chunk counts filter on it
+}
+
+# Full-text (BM25) indexes backing hybrid retrieval
+FTS_INDEX_COLUMNS = ["text", "table_json"]
+
+# Rows embedded and written per batch during indexing
+UPSERT_BATCH_SIZE = 256
+# Stale (page_number, chunk_hash) keys OR'd into one delete filter after a re-ingest
+STALE_DELETE_BATCH = 200
+# SentenceTransformer encode batch size, and worker processes for multi-process encoding (<= 1 disables the pool)
+EMBED_BATCH_SIZE = 64
+EMBED_PROCESSES = int(os.environ.get("EMBED_PROCESSES", "1"))
 
 class ComplianceChunk(LanceModel):
-    vector: Vector(384) # Dim for all-MiniLM-L6-v2
+    vector: Vector(EMBEDDING_DIM) # 384 for all-MiniLM-L6-v2
+    vector_bin: Vector(EMBEDDING_DIM // 8, value_type=pa.uint8()) # Packed sign bits of vector (see quantize_binary)
     text: str
     ticker: str
     section: str
@@ -28,19 +80,223 @@ class ComplianceChunk(LanceModel):
     risk_flag: bool = False # Flag for items requiring high-level audit attention
     cik: str = "" # SEC Central Index Key enabling deeper lookups
     source_pdf: str = "" # Actual PDF filename for View Source button
+    chunk_hash: str = "" # Content hash of text + table_json (part of the upsert key)
+
+# Multi-vector mode: the embedding model only reads the first SPAN_WINDOW_TOKENS word pieces of a
+# chunk (all-MiniLM-L6-v2 truncates at 256 including [CLS]/[SEP]), so the rest of a long chunk is
+# embedded as overlapping token windows in a side table. Retrieval scores a chunk by its best
+# matching window (max-sim) and returns the parent row. Set MULTI_VECTOR=0 to disable.
+MULTI_VECTOR = os.environ.get("MULTI_VECTOR", "1") == "1"
+SPANS_TABLE_NAME = "compliance_audit_spans"
+SPAN_WINDOW_TOKENS = 254
+SPAN_STRIDE_TOKENS = 192 # 62 tokens of overlap between consecutive windows
+SPAN_KEY = UPSERT_KEY + ["span_index"]
+
+class ComplianceSpan(LanceModel):
+    vector: Vector(EMBEDDING_DIM)
+    source_pdf: str
+    page_number: int
+    chunk_hash: str
+    span_index: int # 1..n; window 0 is the parent chunk's own vector
+    # Filter columns copied from the parent so AuditorAgent's where clause applies unchanged
+    ticker: str = ""
+    industry: str = ""
+    year: int = 0
+    filing_type: str = ""
+    jurisdiction: str = ""
+    risk_flag: bool = False
+
+# Arrow schemas used for writes (Lance's v2 format dictionary-encodes low-cardinality strings on disk itself)
+CHUNK_SCHEMA = ComplianceChunk.to_arrow_schema()
+SPAN_SCHEMA = ComplianceSpan.to_arrow_schema()
 
 def create_db(db_path="data/vector_db"):
     db = lancedb.connect(db_path)
     return db
 
-def process_and_upsert(db, json_path, ticker="AAPL", industry="", year=0, filing_type="", fiscal_period="", jurisdiction="", risk_flag=False, cik="", source_pdf=""):
-    with open(json_path, "r") as f:
-        elements = json.load(f)
-    
-    data = []
-    print(f"Processing {len(elements)} elements for {ticker}...")
-    
-    for el in elements:
+def iter_elements(json_path):
+    """
+    Yields processed element dicts one at a time. Reads the streaming JSONL format line by line;
+    legacy indented .json dumps from older ingests are still accepted (loaded whole).
+    """
+    if json_path.endswith(".jsonl"):
+        with open(json_path, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(json_path, "r") as f:
+            yield from json.load(f)
+
+def embed_texts(texts, batch_size=EMBED_BATCH_SIZE, pool=None):
+    """
+    Batched embedding of a list of texts. Uses a SentenceTransformer multi-process pool when one is given.
+    Texts already in the on-disk embedding cache are not re-encoded.
+    """
+    return encode_texts(texts, batch_size=batch_size, pool=pool)
+
+def _embed_rows(data, batch_size, pool, timing):
+    """
+    Embeds a batch of rows in one encode call (returns a float32 matrix) and accumulates timing stats.
+    """
+    start = time.time()
+    vectors = embed_texts([row["text"] for row in data], batch_size=batch_size, pool=pool)
+    timing["seconds"] += time.time() - start
+    timing["chunks"] += len(data)
+    return vectors
+
+def quantize_binary(vectors):
+    """
+    Binary quantization: one bit per dimension (1 where the component is positive), packed into uint8.
+    Accepts a single vector or a matrix; works along the last axis.
+    """
+    return np.packbits(np.asarray(vectors) > 0, axis=-1)
+
+def binary_code_array(vectors):
+    """
+    The packed codes of an embedding matrix as a fixed-size-list<uint8> column.
+    """
+    codes = pa.array(quantize_binary(vectors).ravel(), type=pa.uint8())
+    return pa.FixedSizeListArray.from_arrays(codes, EMBEDDING_DIM // 8)
+
+def build_record_batch(rows, vectors, schema=CHUNK_SCHEMA):
+    """
+    Builds a pyarrow RecordBatch for a batch of rows: the embedding matrix becomes a
+    fixed-size-list<float32> column (plus its binary codes) without per-row numpy objects.
+    """
+    arrays = []
+    for field in schema:
+        if field.name == "vector":
+            flat = pa.array(np.ascontiguousarray(vectors, dtype=np.float32).ravel(), type=pa.float32())
+            arrays.append(pa.FixedSizeListArray.from_arrays(flat, EMBEDDING_DIM))
+        elif field.name == BINARY_VECTOR_COLUMN:
+            arrays.append(binary_code_array(vectors))
+        else:
+            arrays.append(pa.array([row[field.name] for row in rows], type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, names=schema.names)
+
+def conform_batch(batch, schema):
+    """
+    Reorders and casts a batch to a table's on-disk schema. Columns the table doesn't have are
+    dropped; a table column missing from the batch raises ValueError.
+    """
+    arrays = []
+    for field in schema:
+        i = batch.schema.get_field_index(field.name)
+        if i == -1:
+            raise ValueError(f"Batch has no '{field.name}' column required by the table schema")
+        arrays.append(batch.column(i).cast(field.type))
+    return pa.Table.from_batches([pa.RecordBatch.from_arrays(arrays, schema=schema)])
+
+def compute_chunk_hash(text, table_json=""):
+    """
+    Short content hash identifying a chunk independent of when it was ingested.
+    """
+    h = hashlib.sha256(f"{normalize_text(text)}\0{table_json}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def sql_str(value):
+    """
+    Quotes a string literal for LanceDB filter expressions.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _open_for_upsert(db, table_name=TABLE_NAME):
+    """
+    Opens the table, adding the chunk_hash and vector_bin columns to chunk tables created before them
+    (maintain_indexes fills in the codes of existing rows). Returns None if the table does not exist yet.
+    """
+    if table_name not in db.table_names():
+        return None
+    tbl = db.open_table(table_name)
+    if table_name == SPANS_TABLE_NAME:
+        return tbl
+    if "chunk_hash" not in tbl.schema.names:
+        print("Migrating table: adding chunk_hash column...")
+        tbl.add_columns({"chunk_hash": "''"})
+    if BINARY_VECTOR_COLUMN not in tbl.schema.names:
+        print(f"Migrating table: adding {BINARY_VECTOR_COLUMN} column...")
+        tbl.add_columns(pa.field(BINARY_VECTOR_COLUMN, CHUNK_SCHEMA.field(BINARY_VECTOR_COLUMN).type, nullable=True))
+    return tbl
+
+def _upsert_stream(db, tbl, batches, schema, table_name=TABLE_NAME, key=UPSERT_KEY):
+    """
+    Merge-inserts a stream of RecordBatches (already conformed to schema) on key with a single
+    merge_insert: one join against the table and one new version per filing, while memory stays
+    bounded by a batch. Creates the table if it does not exist. Returns the table (None if it
+    does not exist and the stream is empty).
+    """
+    first = next(batches, None)
+    if first is None:
+        return tbl
+    reader = pa.RecordBatchReader.from_batches(schema, itertools.chain([first], batches))
+    if tbl is None:
+        return db.create_table(table_name, data=reader)
+    (
+        tbl.merge_insert(key)
+        .when_matched_update_all()
+        .when_not_matched_insert_all()
+        .execute(reader)
+    )
+    return tbl
+
+def _delete_stale_chunks(tbl, source_pdf, live_keys):
+    """
+    Removes rows of source_pdf whose (page_number, chunk_hash) the latest ingest no longer produced
+    (edited filings, chunks that moved page, legacy rows without a chunk_hash). Only the stale keys
+    end up in the delete filter, in slices of STALE_DELETE_BATCH. Works on the chunk and span tables alike.
+    Skipped (returns 0) when source_pdf is empty.
+    """
+    if not source_pdf:
+        # Every row without a source filename would look stale; nothing identifies this filing's rows
+        print(f"No source_pdf given; skipping stale-row cleanup in {tbl.name}")
+        return 0
+    source = f"source_pdf = {sql_str(source_pdf)}"
+    num_rows = tbl.count_rows(source)
+    if not num_rows:
+        return 0
+    existing = tbl.search().where(source).select(["page_number", "chunk_hash"]).limit(num_rows).to_arrow()
+    stored_keys = set(zip(existing["page_number"].to_pylist(), existing["chunk_hash"].to_pylist()))
+    stale = sorted(stored_keys - set(live_keys), key=lambda k: (k[0], k[1] or ""))
+    if not stale:
+        return 0
+    for i in range(0, len(stale), STALE_DELETE_BATCH):
+        conditions = [
+            f"(page_number = {int(page)} AND " + (f"chunk_hash = {sql_str(h)})" if h is not None else "chunk_hash IS NULL)")
+            for page, h in stale[i:i + STALE_DELETE_BATCH]
+        ]
+        tbl.delete(f"{source} AND ({' OR '.join(conditions)})")
+    removed = num_rows - tbl.count_rows(source)
+    print(f"Removed {removed} stale rows for {source_pdf} from {tbl.name}")
+    return removed
+
+def open_table_if_exists(db, table_name):
+    if table_name not in db.table_names():
+        return None
+    return db.open_table(table_name)
+
+def delete_document(db, source_pdf, table_name=TABLE_NAME):
+    """
+    Deletes every chunk indexed from source_pdf, along with its sub-span vectors.
+    Returns the number of chunk rows removed.
+    """
+    spans_tbl = open_table_if_exists(db, SPANS_TABLE_NAME)
+    if spans_tbl is not None and table_name == TABLE_NAME:
+        spans_tbl.delete(f"source_pdf = {sql_str(source_pdf)}")
+    if table_name not in db.table_names():
+        return 0
+    tbl = db.open_table(table_name)
+    before = tbl.count_rows()
+    tbl.delete(f"source_pdf = {sql_str(source_pdf)}")
+    removed = before - tbl.count_rows()
+    print(f"Deleted {removed} chunks for {source_pdf} from {table_name}")
+    return removed
+
+def iter_rows(json_path, ticker, industry, year, filing_type, fiscal_period, jurisdiction, risk_flag, cik, source_pdf):
+    """
+    Yields one table row (without its vector) per non-empty processed element.
+    """
+    for el in iter_elements(json_path):
         text = el.get("text", "")
         if not text:
             continue
@@ -61,12 +317,8 @@ def process_and_upsert(db, json_path, ticker="AAPL", industry="", year=0, filing
             # Fallback if text_as_html is missing but it is a Table type
             table_json = metadata.get("text_as_html", "")
 
-            
-        # Create embedding
-        vector = model.encode(text)
-        
-        data.append({
-            "vector": vector,
+        yield {
+            "chunk_hash": compute_chunk_hash(text, table_json),
             "text": text,
             "ticker": ticker,
             "section": el.get("type", "Text"), # Using type as section for now
@@ -82,22 +334,343 @@ def process_and_upsert(db, json_path, ticker="AAPL", industry="", year=0, filing
             "risk_flag": risk_flag,
             "cik": cik,
             "source_pdf": source_pdf
-        })
+        }
+
+def iter_span_rows(rows, window=SPAN_WINDOW_TOKENS, stride=SPAN_STRIDE_TOKENS):
+    """
+    Yields one span row (text + parent key + filter columns) per token window past the first,
+    for chunks longer than the model's input window. Short chunks yield nothing.
+    """
+    for row in rows:
+        windows = token_windows(row["text"], window, stride)
+        for span_index, span_text in enumerate(windows[1:], start=1):
+            span = {name: row[name] for name in SPAN_SCHEMA.names if name in row}
+            span["text"] = span_text
+            span["span_index"] = span_index
+            yield span
+
+def _unique_rows(rows, seen_keys):
+    """
+    Drops repeats of a (page_number, chunk_hash) already in seen_keys (merge-insert needs unique
+    source keys); identical chunks on the same page collapse to one row. Adds the keys it yields.
+    """
+    for row in rows:
+        key = (row["page_number"], row["chunk_hash"])
+        if key in seen_keys:
+            continue
+        seen_keys.add(key)
+        yield row
+
+def _embedded_batches(rows, schema, target_schema, batch_size, embed_batch_size, pool, timing, counts):
+    """
+    Embeds rows batch_size at a time and yields them as RecordBatches in target_schema (the table's
+    on-disk schema). counts["rows"] tallies the rows yielded.
+    """
+    for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+        vectors = _embed_rows(batch, embed_batch_size, pool, timing)
+        yield from conform_batch(build_record_batch(batch, vectors, schema=schema), target_schema).to_batches()
+        counts["rows"] += len(batch)
+
+def process_and_upsert(db, json_path, ticker="AAPL", industry="", year=0, filing_type="", fiscal_period="", jurisdiction="", risk_flag=False, cik="", source_pdf="", batch_size=UPSERT_BATCH_SIZE, embed_batch_size=EMBED_BATCH_SIZE, embed_processes=EMBED_PROCESSES, multi_vector=MULTI_VECTOR):
+    """
+    Streams processed elements into the vector table in batches of batch_size rows,
+    so peak memory is bounded by the batch rather than by the document.
+    Each batch is embedded in a single batched encode call (optionally across embed_processes workers),
+    and the batches feed one merge_insert per table as an Arrow RecordBatchReader.
+    Rows are merge-inserted on (source_pdf, page_number, chunk_hash), so re-indexing is idempotent.
+    With multi_vector, chunks longer than the model's input window also get sub-span vectors
+    in SPANS_TABLE_NAME.
+    """
+    seen_keys = set()
+    timing = {"seconds": 0.0, "chunks": 0}
+    chunk_counts = {"rows": 0}
+    span_counts = {"rows": 0}
+    print(f"Processing elements for {ticker} (batch size {batch_size}, embed batch {embed_batch_size}, processes {embed_processes})...")
     
-    # Create or Get table
-    table_name = "compliance_audit"
-    if table_name in db.table_names():
-        tbl = db.open_table(table_name)
-        tbl.add(data)
-    else:
-        tbl = db.create_table(table_name, schema=ComplianceChunk, data=data)
+    pool = None
+    if embed_processes and embed_processes > 1:
+        if EMBEDDING_BACKEND == "onnx":
+            # ONNX Runtime already spreads each batch over EMBEDDING_THREADS intra-op threads
+            print("Multi-process encoding is torch-only; the ONNX backend uses intra-op threads instead.")
+        else:
+            pool = get_embedding_model().start_multi_process_pool(target_devices=["cpu"] * embed_processes)
     
-    print(f"Upserted {len(data)} chunks into {table_name}")
+    def filing_rows(seen):
+        rows = iter_rows(json_path, ticker, industry, year, filing_type, fiscal_period, jurisdiction, risk_flag, cik, source_pdf)
+        return _unique_rows(rows, seen)
+
+    try:
+        tbl = _open_for_upsert(db)
+        schema = tbl.schema if tbl is not None else CHUNK_SCHEMA
+        batches = _embedded_batches(filing_rows(seen_keys), CHUNK_SCHEMA, schema, batch_size, embed_batch_size, pool, timing, chunk_counts)
+        tbl = _upsert_stream(db, tbl, batches, schema)
+
+        spans_tbl = open_table_if_exists(db, SPANS_TABLE_NAME)
+        if multi_vector:
+            # Second pass over the JSONL: the span table gets its own single streamed merge-insert
+            schema = spans_tbl.schema if spans_tbl is not None else SPAN_SCHEMA
+            spans = iter_span_rows(filing_rows(set()))
+            batches = _embedded_batches(spans, SPAN_SCHEMA, schema, batch_size, embed_batch_size, pool, timing, span_counts)
+            spans_tbl = _upsert_stream(db, spans_tbl, batches, schema, table_name=SPANS_TABLE_NAME, key=SPAN_KEY)
+    finally:
+        if pool is not None:
+            get_embedding_model().stop_multi_process_pool(pool)
+    total = chunk_counts["rows"]
+    span_total = span_counts["rows"]
+    
+    rate = timing["chunks"] / timing["seconds"] if timing["seconds"] > 0 else 0
+    print(f"Embedded {timing['chunks']} chunks in {timing['seconds']:.2f}s ({rate:.1f} chunks/sec)")
+    print(format_embedding_cache_stats())
+    
+    if tbl is not None:
+        _delete_stale_chunks(tbl, source_pdf, seen_keys)
+    if spans_tbl is not None:
+        _delete_stale_chunks(spans_tbl, source_pdf, seen_keys)
+    
+    print(f"Upserted {total} chunks into {TABLE_NAME}")
+    if multi_vector:
+        print(f"Upserted {span_total} sub-span vectors into {SPANS_TABLE_NAME}")
     return tbl
 
+def vector_matrix(column):
+    """
+    A fixed-size-list column (Arrow array or chunked array) as a 2-D numpy array, without per-row objects.
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    return column.flatten().to_numpy(zero_copy_only=False).reshape(len(column), column.type.list_size)
+
+def backfill_binary_codes(tbl, batch_size=BINARY_BACKFILL_BATCH):
+    """
+    Fills vector_bin for rows stored before the column existed, from their stored float vectors
+    (nothing is re-embedded), merging batch_size rows at a time on UPSERT_KEY. Legacy rows without a
+    chunk_hash have no unique key and keep null codes; two_stage_search still finds them.
+    Returns the number of rows filled.
+    """
+    if BINARY_VECTOR_COLUMN not in tbl.schema.names:
+        return 0
+    missing = f"{BINARY_VECTOR_COLUMN} IS NULL AND chunk_hash != ''"
+    remaining = tbl.count_rows(missing)
+    filled = 0
+    while remaining:
+        rows = tbl.search().where(missing).limit(batch_size).to_arrow()
+        codes = binary_code_array(vector_matrix(rows["vector"]))
+        i = rows.schema.get_field_index(BINARY_VECTOR_COLUMN)
+        rows = rows.set_column(i, rows.schema.field(i), codes)
+        tbl.merge_insert(UPSERT_KEY).when_matched_update_all().execute(rows)
+        left = tbl.count_rows(missing)
+        if left >= remaining:
+            break # Nothing matched back (should not happen); don't spin
+        filled += remaining - left
+        remaining = left
+    if filled:
+        print(f"Filled {BINARY_VECTOR_COLUMN} codes for {filled} rows of {tbl.name}")
+    return filled
+
+def two_stage_search(tbl, query_vector, limit, oversample, projection=None, where_clause=None, prefilter=True, nprobes=20, include_uncoded=False):
+    """
+    Binary two-stage search: a hamming pass over vector_bin picks limit * oversample candidates, then
+    only those candidates' float32 vectors are read and rescored with exact squared L2 (the float
+    search's _distance). With include_uncoded, rows whose codes are still null are searched exactly
+    on their float vectors and merged in. Returns a DataFrame of at most limit rows, nearest first.
+    """
+    projection = dict(projection or {c: c for c in tbl.schema.names if c not in ("vector", BINARY_VECTOR_COLUMN)})
+    coded_filter = where_clause
+    if include_uncoded:
+        coded_filter = f"{BINARY_VECTOR_COLUMN} IS NOT NULL" + (f" AND ({where_clause})" if where_clause else "")
+    query = (
+        tbl.search(quantize_binary(query_vector), vector_column_name=BINARY_VECTOR_COLUMN)
+        .distance_type(BINARY_INDEX_METRIC)
+        .limit(limit * oversample)
+        .nprobes(nprobes)
+        .select({**projection, "vector": "vector"})
+    )
+    if coded_filter:
+        query = query.where(coded_filter, prefilter=prefilter)
+    candidates = query.to_arrow()
+    vectors = vector_matrix(candidates["vector"])
+    distances = ((vectors - np.asarray(query_vector, dtype=np.float32)) ** 2).sum(axis=1)
+    results = [candidates.drop_columns(["vector"]).to_pandas().assign(_distance=distances)]
+    if include_uncoded:
+        uncoded_filter = f"{BINARY_VECTOR_COLUMN} IS NULL" + (f" AND ({where_clause})" if where_clause else "")
+        results.append(
+            tbl.search(query_vector)
+            .where(uncoded_filter, prefilter=True)
+            .bypass_vector_index()
+            .limit(limit)
+            .select(projection)
+            .to_pandas()
+        )
+    return pd.concat(results, ignore_index=True).sort_values("_distance", kind="stable").head(limit).reset_index(drop=True)
+
+def _find_index(tbl, column):
+    for idx in tbl.list_indices():
+        if column in idx.columns:
+            return idx
+    return None
+
+def _load_vector_index_state():
+    try:
+        with open(VECTOR_INDEX_STATE_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _index_state_key(tbl, column):
+    return tbl.name if column == "vector" else f"{tbl.name}.{column}"
+
+def _record_trained_rows(table_name, num_rows):
+    state = _load_vector_index_state()
+    state[table_name] = {"trained_rows": num_rows, "trained_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+    os.makedirs(os.path.dirname(VECTOR_INDEX_STATE_PATH) or ".", exist_ok=True)
+    tmp_path = f"{VECTOR_INDEX_STATE_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, VECTOR_INDEX_STATE_PATH)
+
+def build_vector_index(tbl, num_rows=None, column="vector"):
+    """
+    (Re)trains the ANN index on a vector column. Partitions scale with sqrt(rows). The float column
+    gets IVF_PQ with 8 dims per sub-vector; the binary column gets IVF_FLAT over hamming distance
+    (its codes are already compact). Records the training row count in VECTOR_INDEX_STATE_PATH.
+    """
+    num_rows = num_rows or tbl.count_rows()
+    num_partitions = max(1, int(math.sqrt(num_rows)))
+    start = time.time()
+    if column == BINARY_VECTOR_COLUMN:
+        print(f"Building {BINARY_INDEX_TYPE} ({BINARY_INDEX_METRIC}) index on {column} over {num_rows} rows ({num_partitions} partitions)...")
+        tbl.create_index(
+            metric=BINARY_INDEX_METRIC,
+            vector_column_name=column,
+            num_partitions=num_partitions,
+            index_type=BINARY_INDEX_TYPE,
+            replace=True
+        )
+    else:
+        num_sub_vectors = max(1, EMBEDDING_DIM // 8)
+        print(f"Building {VECTOR_INDEX_TYPE} index over {num_rows} rows ({num_partitions} partitions, {num_sub_vectors} sub-vectors)...")
+        tbl.create_index(
+            metric=VECTOR_INDEX_METRIC,
+            vector_column_name=column,
+            num_partitions=num_partitions,
+            num_sub_vectors=num_sub_vectors,
+            index_type=VECTOR_INDEX_TYPE,
+            replace=True
+        )
+    _record_trained_rows(_index_state_key(tbl, column), num_rows)
+    print(f"Vector index on {column} built in {time.time() - start:.2f}s")
+
+def ensure_vector_index(tbl, min_rows=VECTOR_INDEX_MIN_ROWS, retrain_fraction=VECTOR_INDEX_RETRAIN_FRACTION, column="vector"):
+    """
+    Applies the index lifecycle policy. Returns the action taken: 'skipped', 'built', 'retrained' or 'current'.
+    Retrains once the table has grown by more than retrain_fraction since the index was last trained
+    (whether or not optimize() has since folded the new rows into it). Until then, unindexed rows are
+    still found (LanceDB scans them flat alongside the index).
+    """
+    num_rows = tbl.count_rows()
+    idx = _find_index(tbl, column)
+    if idx is None:
+        if num_rows < min_rows:
+            return "skipped"
+        build_vector_index(tbl, num_rows, column=column)
+        return "built"
+
+    state_key = _index_state_key(tbl, column)
+    trained = _load_vector_index_state().get(state_key, {}).get("trained_rows")
+    if trained is None:
+        # Index built before training sizes were recorded: take its current coverage as the baseline
+        trained = tbl.index_stats(idx.name).num_indexed_rows
+        _record_trained_rows(state_key, trained)
+    trained = max(trained, 1)
+    if num_rows - trained > retrain_fraction * trained:
+        print(f"{num_rows - trained} rows added since the {column} index was trained on {trained} exceed {retrain_fraction:.0%}; retraining.")
+        build_vector_index(tbl, num_rows, column=column)
+        return "retrained"
+    return "current"
+
+def update_indexes(tbl):
+    """
+    Folds rows added since the indexes were built into every existing index incrementally: the new
+    rows are indexed as a delta and existing index data is not rewritten. Goes through
+    Table.optimize() (no pylance needed), which also compacts small fragments and prunes versions
+    past LanceDB's default 7-day retention, as a maintenance pass does.
+    """
+    tbl.optimize()
+
+def ensure_scalar_indexes(tbl, rebuild=False):
+    """
+    Creates missing scalar indexes on the filter columns and incrementally updates any that have
+    unindexed rows; rebuild=True recreates every existing one from scratch. Returns {column: action}.
+    """
+    actions = {}
+    needs_update = False
+    for column, index_type in SCALAR_INDEX_COLUMNS.items():
+        if column not in tbl.schema.names:
+            continue
+        idx = _find_index(tbl, column)
+        if idx is None:
+            tbl.create_scalar_index(column, index_type=index_type)
+            actions[column] = "built"
+        elif rebuild:
+            tbl.create_scalar_index(column, index_type=index_type, replace=True)
+            actions[column] = "rebuilt"
+        elif tbl.index_stats(idx.name).num_unindexed_rows > 0:
+            needs_update = True
+            actions[column] = "updated"
+        else:
+            actions[column] = "current"
+    if needs_update:
+        update_indexes(tbl)
+    return actions
+
+def ensure_fts_indexes(tbl, rebuild=False):
+    """
+    Creates missing full-text indexes and incrementally updates any with unindexed rows, so an
+    ingest only tokenizes its own rows; rebuild=True re-tokenizes every row. Returns {column: action}.
+    """
+    actions = {}
+    needs_update = False
+    for column in FTS_INDEX_COLUMNS:
+        if column not in tbl.schema.names:
+            continue
+        idx = _find_index(tbl, column)
+        if idx is None:
+            tbl.create_fts_index(column, use_tantivy=False)
+            actions[column] = "built"
+        elif rebuild:
+            tbl.create_fts_index(column, use_tantivy=False, replace=True)
+            actions[column] = "rebuilt"
+        elif tbl.index_stats(idx.name).num_unindexed_rows > 0:
+            needs_update = True
+            actions[column] = "updated"
+        else:
+            actions[column] = "current"
+    if needs_update:
+        update_indexes(tbl)
+    return actions
+
+def maintain_indexes(tbl, rebuild=False):
+    """
+    Keeps the table's indexes in line with its contents. Called after every upsert.
+    rebuild=True recreates the scalar and full-text indexes instead of updating them incrementally.
+    Chunk tables also get binary codes for rows stored before vector_bin, and an index over them.
+    """
+    action = ensure_vector_index(tbl)
+    print(f"Vector index: {action}")
+    binary_action = None
+    if BINARY_VECTOR_COLUMN in tbl.schema.names:
+        backfill_binary_codes(tbl)
+        binary_action = ensure_vector_index(tbl, column=BINARY_VECTOR_COLUMN)
+        print(f"Binary code index: {binary_action}")
+    scalar_actions = ensure_scalar_indexes(tbl, rebuild=rebuild)
+    print(f"Scalar indexes: {scalar_actions}")
+    fts_actions = ensure_fts_indexes(tbl, rebuild=rebuild)
+    print(f"Full-text indexes: {fts_actions}")
+    return {"vector": action, "binary": binary_action, "scalar": scalar_actions, "fts": fts_actions}
+
 if __name__ == "__main__":
     DB_PATH = "data/vector_db"
-    JSON_PATH = "data/processed/alphabet_10k_2023.json"
+    JSON_PATH = "data/processed/alphabet_10k_2023.jsonl"
     
     if os.path.exists(JSON_PATH):
         db = create_db(DB_PATH)
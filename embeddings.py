@@ -0,0 +1,356 @@
+import os
+import json
+import hashlib
+import threading
+import time
+import unicodedata
+import numpy as np
+from cache_store import LazyDiskCache
+
+# Process-wide embedding provider. Every module (ingestion, agent, app, scripts) goes through
+# get_embedding_model() so each process loads the model once, on first use, instead of at import.
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# Inference backend: "torch" (SentenceTransformer) or "onnx" (ONNX Runtime on CPU, no torch import).
+# EMBEDDING_QUANTIZE=1 runs the ONNX model with dynamic int8 weight quantization; EMBEDDING_THREADS
+# sets ONNX Runtime intra-op threads (0 = one per physical core). See scripts/benchmark_embeddings.py.
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_QUANTIZE = os.environ.get("EMBEDDING_QUANTIZE", "0") == "1"
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))
+ONNX_MODEL_DIR = "data/models"
+
+# Cross-encoder used by the agent's rerank node (scores question/chunk pairs jointly, CPU-friendly).
+# It follows EMBEDDING_BACKEND/EMBEDDING_QUANTIZE, so with the ONNX backend no query path imports torch.
+RERANKER_MODEL = os.environ.get("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# Known output dimensions, so schema definitions and UI metrics don't have to load the model
+KNOWN_DIMENSIONS = {
+    "all-MiniLM-L6-v2": 384,
+    "all-MiniLM-L12-v2": 384,
+    "all-mpnet-base-v2": 768,
+}
+
+# Persistent embedding cache keyed by model id + normalized-text hash. Repeated 10-K boilerplate
+# and repeated questions are embedded once. Set EMBEDDING_CACHE=0 to disable.
+EMBEDDING_CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE", "1") == "1"
+EMBEDDING_CACHE_PATH = "data/cache/embeddings.sqlite"
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000 # ~300MB at 384 float32 dims
+
+_models = {} # (model_name, backend, quantize) -> loaded model
+_rerankers = {} # (model_name, backend, quantize) -> loaded cross-encoder
+_cache = LazyDiskCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+_load_lock = threading.Lock()
+LOAD_TIMINGS = {} # model_name -> seconds spent loading
+
+class OnnxSentenceEncoder:
+    """
+    Minimal SentenceTransformer stand-in running a sentence-transformers export through ONNX Runtime:
+    tokenize (tokenizers), run the transformer, pool (mean or CLS) and L2-normalize as the
+    model's own pipeline config says. Implements the encode() subset the pipeline uses.
+    """
+    def __init__(self, model_name, quantize=False, threads=0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        repo_dir = _download_sentence_transformer(model_name)
+        onnx_path = os.path.join(repo_dir, "onnx", "model.onnx")
+        if quantize:
+            onnx_path = _quantized_onnx_path(model_name, onnx_path)
+
+        with open(os.path.join(repo_dir, "sentence_bert_config.json")) as f:
+            self.max_seq_length = json.load(f).get("max_seq_length", 256)
+        with open(os.path.join(repo_dir, "1_Pooling", "config.json")) as f:
+            pooling = json.load(f)
+        self.cls_pooling = pooling.get("pooling_mode_cls_token", False)
+        self.dimension = pooling["word_embedding_dimension"]
+        with open(os.path.join(repo_dir, "modules.json")) as f:
+            self.normalize = any(m["type"].endswith("Normalize") for m in json.load(f))
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(repo_dir, "tokenizer.json"))
+        self.window_tokenizer = Tokenizer.from_file(os.path.join(repo_dir, "tokenizer.json"))
+        self.window_tokenizer.no_truncation()
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        if self.tokenizer.padding is None:
+            self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def token_offsets(self, text):
+        """Character (start, end) offsets of every word piece in text, without truncation."""
+        return self.window_tokenizer.encode(text, add_special_tokens=False).offsets
+
+    def encode(self, sentences, batch_size=64, show_progress_bar=False, **kwargs):
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            encodings = self.tokenizer.encode_batch(list(sentences[start:start + batch_size]))
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            hidden = self.session.run(None, feeds)[0]
+
+            if self.cls_pooling:
+                pooled = hidden[:, 0]
+            else:
+                mask = attention_mask[..., None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+        if not batches:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.concatenate(batches)
+
+class OnnxCrossEncoder:
+    """
+    Minimal CrossEncoder stand-in on ONNX Runtime: tokenizes (question, passage) pairs jointly,
+    runs the sequence-classification export and applies a sigmoid to its single logit, matching
+    the torch reranker's Sigmoid head. Implements the predict() subset the agent uses.
+    """
+    def __init__(self, model_name, quantize=False, threads=0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        repo_dir = _download_cross_encoder(model_name)
+        onnx_path = os.path.join(repo_dir, "onnx", "model.onnx")
+        if quantize:
+            onnx_path = _quantized_onnx_path(model_name, onnx_path)
+
+        with open(os.path.join(repo_dir, "config.json")) as f:
+            max_length = json.load(f).get("max_position_embeddings", 512)
+        self.tokenizer = Tokenizer.from_file(os.path.join(repo_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        if self.tokenizer.padding is None:
+            self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False, **kwargs):
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            encodings = self.tokenizer.encode_batch([tuple(p) for p in pairs[start:start + batch_size]])
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            }
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            logits = self.session.run(None, feeds)[0].reshape(len(encodings), -1)[:, 0]
+            scores.append(1.0 / (1.0 + np.exp(-logits.astype(np.float32))))
+        if not scores:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(scores)
+
+def _download_sentence_transformer(model_name):
+    """
+    Fetches the files OnnxSentenceEncoder needs (ONNX export, tokenizer, pipeline config) from
+    the Hugging Face hub cache. Bare names resolve to the sentence-transformers organisation.
+    """
+    from huggingface_hub import snapshot_download
+
+    repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    return snapshot_download(repo_id, allow_patterns=[
+        "onnx/model.onnx", "tokenizer.json", "sentence_bert_config.json", "modules.json", "1_Pooling/config.json",
+    ])
+
+def _download_cross_encoder(model_name):
+    """
+    Fetches the ONNX export, tokenizer and config OnnxCrossEncoder needs from the Hugging Face hub cache.
+    """
+    from huggingface_hub import snapshot_download
+
+    return snapshot_download(model_name, allow_patterns=["onnx/model.onnx", "tokenizer.json", "config.json"])
+
+def _quantized_onnx_path(model_name, onnx_path):
+    """
+    Dynamic int8 quantization of the ONNX weights (activations stay float and are quantized per
+    batch at run time). The quantized file is written once under ONNX_MODEL_DIR and reused.
+    """
+    quantized_path = os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "--"), "model_qint8.onnx")
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        os.makedirs(os.path.dirname(quantized_path), exist_ok=True)
+        print(f"Quantizing ONNX model '{model_name}' to int8...")
+        quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+def embedding_variant(model_name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND, quantize=EMBEDDING_QUANTIZE):
+    """
+    Identifies the vectors a model/backend combination produces (part of embedding cache keys).
+    The torch backend keeps the bare model name so existing cache entries stay valid.
+    """
+    if backend == "torch":
+        return model_name
+    return f"{model_name}@{backend}{'-qint8' if quantize else ''}"
+
+def get_embedding_model(model_name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND, quantize=EMBEDDING_QUANTIZE):
+    """
+    Returns the shared encoder for model_name on the given backend, loading it lazily on first use.
+    Thread-safe: concurrent callers (e.g. Streamlit sessions) wait for a single load.
+    """
+    key = (model_name, backend, quantize)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _load_lock:
+        model = _models.get(key)
+        if model is None:
+            variant = embedding_variant(model_name, backend, quantize)
+            print(f"Loading embedding model '{variant}'...")
+            start = time.time()
+            if backend == "onnx":
+                model = OnnxSentenceEncoder(model_name, quantize=quantize, threads=EMBEDDING_THREADS)
+            else:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(model_name)
+            LOAD_TIMINGS[variant] = time.time() - start
+            print(f"Embedding model '{variant}' loaded in {LOAD_TIMINGS[variant]:.2f}s")
+            _models[key] = model
+    return model
+
+def get_reranker_model(model_name=RERANKER_MODEL, backend=EMBEDDING_BACKEND, quantize=EMBEDDING_QUANTIZE):
+    """
+    Returns the shared cross-encoder for model_name on the given backend, loading it lazily on
+    first use (thread-safe). Scores from either backend are probabilities in [0, 1].
+    """
+    key = (model_name, backend, quantize)
+    model = _rerankers.get(key)
+    if model is not None:
+        return model
+
+    with _load_lock:
+        model = _rerankers.get(key)
+        if model is None:
+            variant = embedding_variant(model_name, backend, quantize)
+            print(f"Loading reranker model '{variant}'...")
+            start = time.time()
+            if backend == "onnx":
+                model = OnnxCrossEncoder(model_name, quantize=quantize, threads=EMBEDDING_THREADS)
+            else:
+                model = _load_torch_cross_encoder(model_name)
+            LOAD_TIMINGS[variant] = time.time() - start
+            print(f"Reranker model '{variant}' loaded in {LOAD_TIMINGS[variant]:.2f}s")
+            _rerankers[key] = model
+    return model
+
+def _load_torch_cross_encoder(model_name):
+    import torch
+    from sentence_transformers import CrossEncoder
+    # ms-marco cross-encoders ship an Identity head (raw logits); a sigmoid puts scores in
+    # [0, 1] so the agent's RERANK_*_SCORE thresholds are probabilities
+    return CrossEncoder(model_name, device="cpu", activation_fn=torch.nn.Sigmoid())
+
+def get_embedding_dimension(model_name=EMBEDDING_MODEL):
+    """
+    Returns the embedding dimension without loading the model when it is already known.
+    """
+    for (name, _, _), model in _models.items():
+        if name == model_name:
+            return model.get_sentence_embedding_dimension()
+    if model_name in KNOWN_DIMENSIONS:
+        return KNOWN_DIMENSIONS[model_name]
+    return get_embedding_model(model_name).get_sentence_embedding_dimension()
+
+def get_embedding_cache():
+    """
+    Returns the shared on-disk embedding cache (opened lazily), or None when disabled.
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    return _cache.get()
+
+def normalize_text(text):
+    """
+    Normalization applied before hashing: Unicode NFKC and collapsed whitespace, so
+    re-extracted boilerplate with different line breaks or spacing maps to the same key.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+def embedding_cache_key(text, variant=EMBEDDING_MODEL):
+    h = hashlib.sha256(f"{variant}\0{normalize_text(text)}".encode("utf-8"))
+    return h.hexdigest()
+
+def encode_texts(texts, batch_size=64, pool=None, model_name=EMBEDDING_MODEL, use_cache=True, backend=EMBEDDING_BACKEND, quantize=EMBEDDING_QUANTIZE):
+    """
+    Embeds a list of texts, serving repeats from the embedding cache and encoding only the
+    misses (in one batched call, or across a multi-process pool when one is given).
+    Returns a float32 array of shape (len(texts), dim).
+    """
+    cache = get_embedding_cache() if use_cache else None
+    keys = [embedding_cache_key(t, embedding_variant(model_name, backend, quantize)) for t in texts]
+    cached = cache.get_many(list(set(keys))) if cache else {}
+
+    missing = list(dict.fromkeys(k for k in keys if k not in cached))
+    computed = {}
+    if missing:
+        text_for_key = dict(zip(keys, texts))
+        miss_texts = [text_for_key[k] for k in missing]
+        model = get_embedding_model(model_name, backend, quantize)
+        if pool is not None:
+            vectors = model.encode_multi_process(miss_texts, pool, batch_size=batch_size)
+        else:
+            vectors = model.encode(miss_texts, batch_size=batch_size, show_progress_bar=False)
+        computed = {k: np.asarray(v, dtype=np.float32) for k, v in zip(missing, vectors)}
+        if cache:
+            cache.put_many([(k, v.tobytes()) for k, v in computed.items()])
+
+    return np.stack([
+        computed[k] if k in computed else np.frombuffer(cached[k], dtype=np.float32)
+        for k in keys
+    ])
+
+def token_windows(text, window, stride, model_name=EMBEDDING_MODEL):
+    """
+    Splits text into overlapping windows of at most `window` word pieces of the model's own
+    tokenizer, starting every `stride` tokens. Returns the window substrings; text that fits
+    in one window comes back as [text].
+    """
+    model = get_embedding_model(model_name)
+    if isinstance(model, OnnxSentenceEncoder):
+        offsets = model.token_offsets(text)
+    else:
+        offsets = model.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    if len(offsets) <= window:
+        return [text]
+
+    windows = []
+    for start in range(0, len(offsets), stride):
+        end = min(start + window, len(offsets))
+        windows.append(text[offsets[start][0]:offsets[end - 1][1]])
+        if end == len(offsets):
+            break
+    return windows
+
+def embed_query(text, model_name=EMBEDDING_MODEL):
+    """
+    Embeds a single query string (through the embedding cache).
+    """
+    return encode_texts([text], model_name=model_name)[0]
+
+def format_embedding_cache_stats():
+    cache = get_embedding_cache()
+    if cache is None:
+        return "Embedding cache: disabled"
+    stats = cache.stats()
+    return f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries"
+
+def is_loaded(model_name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND, quantize=EMBEDDING_QUANTIZE):
+    return (model_name, backend, quantize) in _models
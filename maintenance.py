@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import threading
+from datetime import timedelta
+import lancedb
+from database import maintain_indexes, TABLE_NAME, SPANS_TABLE_NAME
+
+# Lance writes a new dataset version (and new fragments) on every add/merge/delete. This module
+# compacts small fragments, prunes versions older than the retention window, and refreshes indexes.
+# Readers are never blocked: compaction commits a new version while open readers keep using theirs,
+# and the retention window keeps recent versions alive for readers that have not caught up yet.
+DB_PATH = "data/vector_db"
+MAINTAINED_TABLES = [TABLE_NAME, SPANS_TABLE_NAME]
+VERSION_RETENTION_DAYS = float(os.environ.get("VERSION_RETENTION_DAYS", "7"))
+MAINTENANCE_INTERVAL_MINUTES = float(os.environ.get("MAINTENANCE_INTERVAL_MINUTES", "0")) # 0 = no scheduler
+LOCK_PATH = "data/maintenance.lock"
+STALE_LOCK_SECONDS = 6 * 3600
+
+_scheduler = None
+
+def _acquire_lock():
+    """
+    Cross-process lock so the CLI, the pipeline and an app scheduler never maintain concurrently.
+    """
+    os.makedirs(os.path.dirname(LOCK_PATH), exist_ok=True)
+    if os.path.exists(LOCK_PATH) and time.time() - os.path.getmtime(LOCK_PATH) > STALE_LOCK_SECONDS:
+        os.remove(LOCK_PATH)
+    try:
+        fd = os.open(LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+    return True
+
+def _release_lock():
+    if os.path.exists(LOCK_PATH):
+        os.remove(LOCK_PATH)
+
+def maintain_table(tbl, retention_days=VERSION_RETENTION_DAYS, reindex=True, rebuild=False):
+    """
+    Compacts fragments, prunes old versions, folds new rows into existing indexes and
+    (optionally) applies the index lifecycle policy for one table. rebuild=True also recreates
+    the scalar and full-text indexes from scratch. Returns a summary dict.
+    """
+    start = time.time()
+    before = tbl.stats()["fragment_stats"]["num_fragments"]
+    versions_before = len(tbl.list_versions())
+
+    # optimize() = compaction + version cleanup + incremental index update, committed as a new version
+    tbl.optimize(cleanup_older_than=timedelta(days=retention_days))
+    indexes = maintain_indexes(tbl, rebuild=rebuild) if reindex else {}
+
+    summary = {
+        "table": tbl.name,
+        "rows": tbl.count_rows(),
+        "fragments_before": before,
+        "fragments_after": tbl.stats()["fragment_stats"]["num_fragments"],
+        "versions_before": versions_before,
+        "versions_after": len(tbl.list_versions()),
+        "indexes": indexes,
+        "seconds": round(time.time() - start, 2),
+    }
+    print(
+        f"[maintenance] {summary['table']}: fragments {summary['fragments_before']} -> {summary['fragments_after']}, "
+        f"versions {summary['versions_before']} -> {summary['versions_after']} in {summary['seconds']}s"
+    )
+    return summary
+
+def run_maintenance(db_path=DB_PATH, retention_days=VERSION_RETENTION_DAYS, reindex=True, rebuild=False):
+    """
+    One maintenance pass over every maintained table. Skips (returns None) if another pass holds the lock.
+    """
+    if not _acquire_lock():
+        print("[maintenance] Another maintenance pass is running; skipping.")
+        return None
+    try:
+        db = lancedb.connect(db_path)
+        existing = db.table_names()
+        return [
+            maintain_table(db.open_table(name), retention_days, reindex, rebuild)
+            for name in MAINTAINED_TABLES if name in existing
+        ]
+    finally:
+        _release_lock()
+
+def refresh_indexes(tables):
+    """
+    Index maintenance after an ingest, under the same lock as maintenance passes so it never races
+    a compaction/cleanup commit. If a pass holds the lock, the indexes are left to the scheduler or
+    the next pass (rows not yet indexed are still searched flat). Returns False when skipped.
+    """
+    if not _acquire_lock():
+        print("[maintenance] A maintenance pass is running; deferring index refresh to it.")
+        return False
+    try:
+        for tbl in tables:
+            maintain_indexes(tbl)
+        return True
+    finally:
+        _release_lock()
+
+def _scheduler_loop(interval_minutes, db_path, retention_days):
+    while True:
+        time.sleep(interval_minutes * 60)
+        try:
+            run_maintenance(db_path, retention_days)
+        except Exception as e:
+            print(f"[maintenance] Pass failed: {e}")
+
+def start_maintenance_scheduler(interval_minutes=MAINTENANCE_INTERVAL_MINUTES, db_path=DB_PATH, retention_days=VERSION_RETENTION_DAYS):
+    """
+    Starts a process-wide daemon thread that runs maintenance every interval_minutes.
+    Idempotent; returns the thread (None if interval_minutes <= 0).
+    """
+    global _scheduler
+    if interval_minutes <= 0:
+        return None
+    if _scheduler is None or not _scheduler.is_alive():
+        _scheduler = threading.Thread(
+            target=_scheduler_loop, args=(interval_minutes, db_path, retention_days),
+            name="lance-maintenance", daemon=True
+        )
+        _scheduler.start()
+        print(f"[maintenance] Scheduler started (every {interval_minutes:g} min, {retention_days:g}-day retention)")
+    return _scheduler
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compact and clean up the LanceDB vault")
+    parser.add_argument("--retention-days", type=float, default=VERSION_RETENTION_DAYS, help="Keep dataset versions newer than this")
+    parser.add_argument("--no-reindex", action="store_true", help="Skip index refresh after compaction")
+    parser.add_argument("--rebuild-indexes", action="store_true", help="Recreate scalar and full-text indexes instead of updating them")
+    parser.add_argument("--every", type=float, default=0, help="Run continuously, every N minutes")
+    args = parser.parse_args()
+
+    run_maintenance(retention_days=args.retention_days, reindex=not args.no_reindex, rebuild=args.rebuild_indexes)
+    if args.every > 0:
+        print(f"[maintenance] Running every {args.every:g} minutes (Ctrl+C to stop)...")
+        try:
+            while True:
+                time.sleep(args.every * 60)
+                run_maintenance(retention_days=args.retention_days, reindex=not args.no_reindex)
+        except KeyboardInterrupt:
+            sys.exit(0)
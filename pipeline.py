@@ -2,8 +2,10 @@ import os
 import json
 import time
 import requests
-from ingest import ingest_pdf
-from database import create_db, process_and_upsert
+from ingest import ingest_document, HTML_EXTENSIONS, DEFAULT_WORKERS, PAGE_TRIAGE, format_partition_cache_stats
+from maintenance import run_maintenance, refresh_indexes, VERSION_RETENTION_DAYS
+from verdict_cache import invalidate_source, get_verdict_cache
+from database import create_db, process_and_upsert, delete_document, open_table_if_exists, sql_str, EMBED_PROCESSES, SPANS_TABLE_NAME, VECTOR_INDEX_STATE_PATH
 
 MANIFEST_PATH = "data/manifest.json"
 DB_PATH = "data/vector_db"
@@ -35,13 +37,22 @@ def purge_vault():
         shutil.rmtree(PROCESSED_DIR)
     if os.path.exists(MANIFEST_PATH):
         os.remove(MANIFEST_PATH)
+    if os.path.exists(VECTOR_INDEX_STATE_PATH):
+        os.remove(VECTOR_INDEX_STATE_PATH)
+    cache = get_verdict_cache()
+    if cache is not None:
+        cache.clear()
     # Re-initialize empty manifest
     save_manifest({"documents": []})
     print("--- VAULT PURGED: DB and Manifest reset to baseline ---")
 
-def ingest_and_index(file_path, ticker, filing_type="10-K", industry="", year=0, fiscal_period="", jurisdiction="", risk_flag=False, cik=""):
+def ingest_and_index(file_path, ticker, filing_type="10-K", industry="", year=0, fiscal_period="", jurisdiction="", risk_flag=False, cik="", workers=DEFAULT_WORKERS, use_cache=True, triage=PAGE_TRIAGE, embed_processes=EMBED_PROCESSES):
     """
-    Unified pipeline to process a PDF and index it in LanceDB.
+    Unified pipeline to process a filing (PDF or EDGAR HTML) and index it in LanceDB.
+    workers > 1 partitions the PDF in parallel page windows.
+    use_cache=False forces a fresh partition even if the PDF bytes are unchanged.
+    triage=False sends every page through 'hi_res' instead of only table/image pages.
+    embed_processes > 1 embeds chunks with a multi-process encoding pool.
     """
     start_time = time.time()
     filename = os.path.basename(file_path)
@@ -49,22 +60,29 @@ def ingest_and_index(file_path, ticker, filing_type="10-K", industry="", year=0,
     print(f"--- Pipeline Starting for {ticker} ({filename}) ---")
     
     # 1. Ingest (Partition + Map coordinates)
-    # ingest_pdf creates a JSON in data/processed/
-    json_path = ingest_pdf(file_path, output_dir=PROCESSED_DIR)
+    # ingest_document creates a JSONL file in data/processed/ (HTML filings skip the PDF path entirely)
+    json_path = ingest_document(file_path, output_dir=PROCESSED_DIR, workers=workers, use_cache=use_cache, triage=triage)
     
     # 2. Index (Embed + Upsert to LanceDB)
     db = create_db(DB_PATH)
-    process_and_upsert(
+    tbl = process_and_upsert(
         db, json_path, ticker=ticker, industry=industry, year=year, 
         filing_type=filing_type, fiscal_period=fiscal_period, 
         jurisdiction=jurisdiction, risk_flag=risk_flag, cik=cik,
-        source_pdf=filename
+        source_pdf=filename, embed_processes=embed_processes
     )
+    # Re-indexing replaces this filing's chunks; drop grading verdicts cached against the old ones
+    invalidate_source(filename)
+    chunk_count = 0
+    if tbl is not None:
+        chunk_count = tbl.count_rows(f"source_pdf = {sql_str(filename)}")
+    spans_tbl = open_table_if_exists(db, SPANS_TABLE_NAME)
+    refresh_indexes([t for t in (tbl, spans_tbl) if t is not None])
     
     # 3. Update Manifest
     manifest = load_manifest()
     
-    # Check if already exists to avoid duplicates in manifest (lancedb.add is additive)
+    # Chunks are merge-inserted, so the table holds one copy per filing; keep the manifest in step
     doc_entry = {
         "ticker": ticker,
         "filename": filename,
@@ -75,6 +93,7 @@ def ingest_and_index(file_path, ticker, filing_type="10-K", industry="", year=0,
         "jurisdiction": jurisdiction,
         "risk_flag": risk_flag,
         "cik": cik,
+        "chunks": chunk_count, # Used by the agent's filter planner for selectivity estimates
         "ingested_at": time.strftime("%Y-%m-%d %H:%M:%S"),
         "path": file_path
     }
@@ -86,9 +105,22 @@ def ingest_and_index(file_path, ticker, filing_type="10-K", industry="", year=0,
     
     duration = time.time() - start_time
     print(f"--- Pipeline Complete in {duration:.2f}s ---")
+    print(format_partition_cache_stats())
     
     return doc_entry
 
+def remove_document(filename):
+    """
+    Removes a single filing from the vault: its chunks in LanceDB and its manifest entry.
+    """
+    db = create_db(DB_PATH)
+    removed = delete_document(db, filename)
+    invalidate_source(filename)
+    manifest = load_manifest()
+    manifest["documents"] = [d for d in manifest["documents"] if d["filename"] != filename]
+    save_manifest(manifest)
+    return removed
+
 def get_cik_from_ticker(ticker):
     """
     Resolves a ticker symbol to a CIK using the SEC's public mapping.
@@ -171,8 +203,11 @@ def fetch_from_edgar(ticker, year):
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Financial Compliance Auditor Pipeline")
-    parser.add_argument("--file", help="Path to a single PDF file")
-    parser.add_argument("--dir", help="Path to a directory of PDFs for batch processing")
+    parser.add_argument("--file", help="Path to a single PDF or HTML filing")
+    parser.add_argument("--dir", help="Path to a directory of PDF/HTML filings for batch processing")
+    parser.add_argument("--maintain", action="store_true", help="Compact fragments, prune old versions and refresh indexes")
+    parser.add_argument("--retention-days", type=float, default=VERSION_RETENTION_DAYS, help="Version retention window (days) for --maintain")
+    parser.add_argument("--delete", metavar="FILENAME", help="Remove an indexed filing (by source filename) from the vault")
     parser.add_argument("--ticker", help="Ticker symbol (required if --file is used)")
     parser.add_argument("--industry", default="", help="Industry classification (e.g., Technology)")
     parser.add_argument("--year", type=int, default=0, help="Filing year (e.g., 2023)")
@@ -181,28 +216,38 @@ if __name__ == "__main__":
     parser.add_argument("--jurisdiction", default="", help="Jurisdiction (e.g., US, UK)")
     parser.add_argument("--risk", action="store_true", help="Mark as high-risk")
     parser.add_argument("--cik", default="", help="CIK (SEC ID)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the partition cache and re-partition")
+    parser.add_argument("--no-triage", action="store_true", help="Partition every page with 'hi_res' (skip fast-path page triage)")
+    parser.add_argument("--embed-processes", type=int, default=EMBED_PROCESSES, help="Worker processes for batched chunk embedding")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker processes for page-parallel partitioning")
     args = parser.parse_args()
     
-    if args.file:
+    if args.maintain:
+        run_maintenance(DB_PATH, retention_days=args.retention_days)
+    elif args.delete:
+        remove_document(args.delete)
+    elif args.file:
         if not args.ticker:
             print("Error: --ticker is required when using --file.")
         elif os.path.exists(args.file):
             ingest_and_index(
                 args.file, args.ticker, filing_type=args.type, industry=args.industry, 
                 year=args.year, fiscal_period=args.period, jurisdiction=args.jurisdiction,
-                risk_flag=args.risk, cik=args.cik
+                risk_flag=args.risk, cik=args.cik, workers=args.workers,
+                use_cache=not args.no_cache, triage=not args.no_triage,
+                embed_processes=args.embed_processes
             )
         else:
             print(f"File not found: {args.file}")
             
     elif args.dir:
         if os.path.exists(args.dir):
-            pdfs = [f for f in os.listdir(args.dir) if f.endswith(".pdf")]
+            pdfs = [f for f in os.listdir(args.dir) if f.lower().endswith((".pdf",) + HTML_EXTENSIONS)]
             print(f"Found {len(pdfs)} PDFs in {args.dir}. High-volume processing starting...")
             for f in pdfs:
                 # Naive ticker detection: use first 4 chars of filename if not provided
                 ticker = f[:4].upper()
-                ingest_and_index(os.path.join(args.dir, f), ticker)
+                ingest_and_index(os.path.join(args.dir, f), ticker, workers=args.workers, use_cache=not args.no_cache, triage=not args.no_triage, embed_processes=args.embed_processes)
         else:
             print(f"Directory not found: {args.dir}")
     else:
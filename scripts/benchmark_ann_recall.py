@@ -0,0 +1,61 @@
+"""
+ANN recall report for the compliance_audit table.
+Compares IVF_PQ search (at several nprobes / refine_factor settings) against exact
+brute-force search, using vectors sampled from the table itself as queries.
+"""
+import sys
+import time
+import random
+import lancedb
+
+DB_PATH = "data/vector_db"
+TABLE_NAME = "compliance_audit"
+
+def sample_query_vectors(table, num_queries):
+    """Sample stored vectors to use as realistic queries."""
+    df = table.search().select(["vector"]).limit(max(num_queries * 20, 1000)).to_pandas()
+    rows = df["vector"].tolist()
+    return random.sample(rows, min(num_queries, len(rows)))
+
+def row_keys(df):
+    return set(zip(df["source_pdf"], df["page_number"], df["chunk_hash"]))
+
+def evaluate_ann_recall(table, num_queries=50, k=8, settings=((10, 1), (20, 5), (50, 10))):
+    """Returns a list of {nprobes, refine_factor, recall, ann_ms, exact_ms} dicts."""
+    queries = sample_query_vectors(table, num_queries)
+    columns = ["source_pdf", "page_number", "chunk_hash"]
+
+    exact = []
+    start = time.perf_counter()
+    for q in queries:
+        exact.append(row_keys(table.search(q).limit(k).bypass_vector_index().select(columns).to_pandas()))
+    exact_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+
+    report = []
+    for nprobes, refine_factor in settings:
+        hits = 0
+        start = time.perf_counter()
+        for q, truth in zip(queries, exact):
+            df = table.search(q).limit(k).nprobes(nprobes).refine_factor(refine_factor).select(columns).to_pandas()
+            hits += len(row_keys(df) & truth)
+        ann_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+        recall = hits / max(sum(len(t) for t in exact), 1)
+        report.append({"nprobes": nprobes, "refine_factor": refine_factor, "recall": recall, "ann_ms": ann_ms, "exact_ms": exact_ms})
+    return report
+
+if __name__ == "__main__":
+    db = lancedb.connect(DB_PATH)
+    if TABLE_NAME not in db.table_names():
+        print(f"Table '{TABLE_NAME}' not found in {DB_PATH}.")
+        sys.exit(1)
+    table = db.open_table(TABLE_NAME)
+    if not any("vector" in idx.columns for idx in table.list_indices()):
+        print("No vector index on this table yet; ANN and exact search are identical.")
+
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    print(f"Rows: {table.count_rows():,} | k={k}")
+    print("=" * 60)
+    print(f"{'nprobes':>8} {'refine':>7} {'recall@k':>9} {'ann ms':>8} {'exact ms':>9}")
+    for r in evaluate_ann_recall(table, k=k):
+        print(f"{r['nprobes']:>8} {r['refine_factor']:>7} {r['recall']:>9.3f} {r['ann_ms']:>8.1f} {r['exact_ms']:>9.1f}")
+    print("=" * 60)
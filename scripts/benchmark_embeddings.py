@@ -0,0 +1,100 @@
+"""
+Embedding backend parity and throughput report.
+Encodes the same texts with the PyTorch SentenceTransformer and with the ONNX Runtime backend
+(float32 and dynamic int8), checks cosine agreement against the PyTorch vectors, and compares
+chunks/sec. Does the same for the rerank cross-encoder (max probability difference, pairs/sec).
+Exits non-zero if a backend falls below its parity threshold.
+
+Usage: python scripts/benchmark_embeddings.py [processed.jsonl] [max_texts]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+# Allow running as `python scripts/benchmark_embeddings.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embeddings import get_embedding_model, get_reranker_model, EMBEDDING_MODEL, EMBEDDING_THREADS, RERANKER_MODEL
+
+# Minimum per-text cosine similarity to the PyTorch vector
+PARITY_THRESHOLDS = {"onnx": 0.999, "onnx-qint8": 0.95}
+# Maximum per-pair difference from the PyTorch reranker's probability
+RERANK_PARITY_THRESHOLDS = {"onnx": 0.001, "onnx-qint8": 0.05}
+RERANK_QUESTIONS = ["Who is the company's independent auditor?", "How did total revenue change year over year?"]
+BATCH_SIZE = 64
+
+SAMPLE_TEXTS = [
+    "Total net sales increased 8% compared to the prior fiscal year.",
+    "The Company is subject to legal proceedings and claims arising in the ordinary course of business.",
+    "Cash, cash equivalents and restricted cash at end of period",
+    "Item 1A. Risk Factors",
+    "Our operations are subject to environmental regulations in the jurisdictions where we mine.",
+    "Goodwill is tested for impairment at the reporting unit level at least annually.",
+    "Deferred tax assets are reduced by a valuation allowance when it is more likely than not that some portion will not be realized.",
+    "Revenue from services is recognized ratably over the contract term.",
+]
+
+def load_texts(json_path=None, max_texts=512):
+    if json_path:
+        from database import iter_elements
+        texts = [el["text"] for el in iter_elements(json_path) if el.get("text")]
+    else:
+        texts = SAMPLE_TEXTS * (max_texts // len(SAMPLE_TEXTS) + 1)
+    return texts[:max_texts]
+
+def time_encode(model, texts):
+    model.encode(texts[:BATCH_SIZE], batch_size=BATCH_SIZE) # Warm-up (session init, allocator)
+    start = time.perf_counter()
+    vectors = np.asarray(model.encode(texts, batch_size=BATCH_SIZE, show_progress_bar=False), dtype=np.float32)
+    return vectors, time.perf_counter() - start
+
+def time_predict(model, pairs):
+    model.predict(pairs[:BATCH_SIZE], batch_size=BATCH_SIZE, show_progress_bar=False) # Warm-up
+    start = time.perf_counter()
+    scores = np.asarray(model.predict(pairs, batch_size=BATCH_SIZE, show_progress_bar=False), dtype=np.float32)
+    return scores, time.perf_counter() - start
+
+def cosine_rows(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+if __name__ == "__main__":
+    json_path = sys.argv[1] if len(sys.argv) > 1 else None
+    max_texts = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    texts = load_texts(json_path, max_texts)
+    print(f"Model: {EMBEDDING_MODEL} | texts: {len(texts)} | batch {BATCH_SIZE} | ONNX threads: {EMBEDDING_THREADS or 'auto'}")
+
+    reference, torch_seconds = time_encode(get_embedding_model(backend="torch", quantize=False), texts)
+    print("=" * 72)
+    print(f"{'backend':<12} {'chunks/sec':>11} {'speedup':>8} {'min cos':>9} {'mean cos':>9} {'parity':>8}")
+    print(f"{'torch':<12} {len(texts) / torch_seconds:>11.1f} {1.0:>7.2f}x {1.0:>9.4f} {1.0:>9.4f} {'ref':>8}")
+
+    failed = False
+    for label, quantize in (("onnx", False), ("onnx-qint8", True)):
+        vectors, seconds = time_encode(get_embedding_model(backend="onnx", quantize=quantize), texts)
+        cosines = cosine_rows(reference, vectors)
+        ok = cosines.min() >= PARITY_THRESHOLDS[label]
+        failed = failed or not ok
+        print(
+            f"{label:<12} {len(texts) / seconds:>11.1f} {torch_seconds / seconds:>7.2f}x "
+            f"{cosines.min():>9.4f} {cosines.mean():>9.4f} {'ok' if ok else 'FAIL':>8}"
+        )
+    print("=" * 72)
+
+    pairs = [(q, t) for t in texts for q in RERANK_QUESTIONS][:max_texts]
+    reference, torch_seconds = time_predict(get_reranker_model(backend="torch", quantize=False), pairs)
+    print(f"Reranker: {RERANKER_MODEL} | pairs: {len(pairs)}")
+    print(f"{'backend':<12} {'pairs/sec':>11} {'speedup':>8} {'max diff':>9} {'mean diff':>9} {'parity':>8}")
+    print(f"{'torch':<12} {len(pairs) / torch_seconds:>11.1f} {1.0:>7.2f}x {0.0:>9.4f} {0.0:>9.4f} {'ref':>8}")
+    for label, quantize in (("onnx", False), ("onnx-qint8", True)):
+        scores, seconds = time_predict(get_reranker_model(backend="onnx", quantize=quantize), pairs)
+        diffs = np.abs(reference - scores)
+        ok = diffs.max() <= RERANK_PARITY_THRESHOLDS[label]
+        failed = failed or not ok
+        print(
+            f"{label:<12} {len(pairs) / seconds:>11.1f} {torch_seconds / seconds:>7.2f}x "
+            f"{diffs.max():>9.4f} {diffs.mean():>9.4f} {'ok' if ok else 'FAIL':>8}"
+        )
+    print("=" * 72)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,107 @@
+"""
+Binary quantization report for the compliance_audit table.
+Compares the two-stage search (hamming over vector_bin, exact L2 rescoring of k * oversample
+candidates' float32 vectors) against exact float32 search, and reports the vector bytes each
+pass reads.
+"""
+import os
+import sys
+import time
+import random
+import lancedb
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from database import two_stage_search, BINARY_VECTOR_COLUMN
+
+DB_PATH = "data/vector_db"
+TABLE_NAME = "compliance_audit"
+KEY_COLUMNS = ["source_pdf", "page_number", "chunk_hash"]
+
+def sample_query_vectors(table, num_queries):
+    """Sample stored vectors to use as realistic queries."""
+    df = table.search().select(["vector"]).limit(max(num_queries * 20, 1000)).to_pandas()
+    rows = df["vector"].tolist()
+    return random.sample(rows, min(num_queries, len(rows)))
+
+def row_keys(df):
+    return list(zip(df["source_pdf"], df["page_number"], df["chunk_hash"]))
+
+def storage_report(table, k, oversample):
+    """
+    Vector bytes read by a full first pass over the table (float32 vs binary codes), the float32
+    bytes the rescoring step reads per query, and what the codes add to the table on disk.
+    """
+    num_rows = table.count_rows()
+    float_bytes = table.schema.field("vector").type.list_size * 4
+    code_bytes = table.schema.field(BINARY_VECTOR_COLUMN).type.list_size
+    return {
+        "rows": num_rows,
+        "float_bytes": float_bytes,
+        "code_bytes": code_bytes,
+        "float_scan_mb": num_rows * float_bytes / 1e6,
+        "code_scan_mb": num_rows * code_bytes / 1e6,
+        "rescore_kb": k * oversample * float_bytes / 1e3,
+        "added_disk_mb": num_rows * code_bytes / 1e6,
+    }
+
+def evaluate_quantization(table, num_queries=50, k=8, oversamples=(1, 4, 10, 20)):
+    """Returns a list of {oversample, recall, top1, two_stage_ms, exact_ms} dicts."""
+    queries = sample_query_vectors(table, num_queries)
+    projection = {c: c for c in KEY_COLUMNS}
+
+    exact = []
+    start = time.perf_counter()
+    for q in queries:
+        exact.append(row_keys(table.search(q).limit(k).bypass_vector_index().select(KEY_COLUMNS).to_pandas()))
+    exact_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+
+    report = []
+    for oversample in oversamples:
+        hits = 0
+        top1 = 0
+        start = time.perf_counter()
+        for q, truth in zip(queries, exact):
+            found = row_keys(two_stage_search(table, q, k, oversample, projection=projection))
+            hits += len(set(found) & set(truth))
+            top1 += bool(found and truth and found[0] == truth[0])
+        two_stage_ms = (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+        recall = hits / max(sum(len(t) for t in exact), 1)
+        report.append({
+            "oversample": oversample,
+            "recall": recall,
+            "top1": top1 / max(len(queries), 1),
+            "two_stage_ms": two_stage_ms,
+            "exact_ms": exact_ms,
+        })
+    return report
+
+if __name__ == "__main__":
+    db = lancedb.connect(DB_PATH)
+    if TABLE_NAME not in db.table_names():
+        print(f"Table '{TABLE_NAME}' not found in {DB_PATH}.")
+        sys.exit(1)
+    table = db.open_table(TABLE_NAME)
+    if BINARY_VECTOR_COLUMN not in table.schema.names:
+        print(f"Table has no {BINARY_VECTOR_COLUMN} column yet; run an ingest or maintenance.py to add it.")
+        sys.exit(1)
+    missing = table.count_rows(f"{BINARY_VECTOR_COLUMN} IS NULL")
+    if missing:
+        print(f"Note: {missing:,} rows have no binary codes yet and are left out of the two-stage pass.")
+
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    storage = storage_report(table, k, oversample=10)
+    print(f"Rows: {storage['rows']:,} | k={k}")
+    print(
+        f"First pass reads: float32 {storage['float_bytes']} B/row ({storage['float_scan_mb']:.1f} MB) | "
+        f"binary {storage['code_bytes']} B/row ({storage['code_scan_mb']:.1f} MB) | "
+        f"{storage['float_bytes'] / storage['code_bytes']:.0f}x fewer bytes"
+    )
+    print(
+        f"Rescoring reads {storage['rescore_kb']:.1f} KB of float32 per query at oversample 10; "
+        f"codes add {storage['added_disk_mb']:.1f} MB on disk"
+    )
+    print("=" * 60)
+    print(f"{'oversample':>10} {'recall@k':>9} {'top-1':>7} {'2-stage ms':>11} {'exact ms':>9}")
+    for r in evaluate_quantization(table, k=k):
+        print(f"{r['oversample']:>10} {r['recall']:>9.3f} {r['top1']:>7.2f} {r['two_stage_ms']:>11.1f} {r['exact_ms']:>9.1f}")
+    print("=" * 60)
@@ -1,16 +1,18 @@
+import os
+import sys
 import lancedb
-from sentence_transformers import SentenceTransformer
+
+# Allow running as `python scripts/query.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from embeddings import embed_query
 
 def query_db(query_text, db_path="data/vector_db", limit=3):
-    print(f"Loading embedding model...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    
     print(f"Connecting to DB at {db_path}...")
     db = lancedb.connect(db_path)
     table = db.open_table("compliance_audit")
     
     print(f"Querying for: '{query_text}'")
-    query_vector = model.encode(query_text)
+    query_vector = embed_query(query_text)
     
     results = table.search(query_vector).limit(limit).to_pandas()
     
@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Modules resolve data/ and logs/ relative to the working directory (agent.py opens its log on
+# import), so tests run from a scratch directory with the repo root on sys.path.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+_workdir = tempfile.mkdtemp(prefix="auditor-tests-")
+os.makedirs(os.path.join(_workdir, "logs"), exist_ok=True)
+os.chdir(_workdir)
+
+
+@pytest.fixture
+def auditor():
+    """
+    AuditorAgent without __init__: no LLM clients, models or vault. Tests attach what they need
+    (e.g. grader_llm) and patch module-level hooks with monkeypatch.
+    """
+    import agent # Imported here so tests that don't use the agent don't need its dependencies
+
+    auditor = object.__new__(agent.AuditorAgent)
+    auditor.table = None
+    auditor.spans_table = None
+    auditor.grader_llm = None
+    return auditor
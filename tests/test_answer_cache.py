@@ -0,0 +1,78 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+import agent
+
+
+class FakeCache:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def update(self, key, fn, tag=None):
+        self.values[key] = fn(self.values.get(key))
+        return self.values[key]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """In-memory answer cache; every scope has fingerprint 'fp' and every question embeds identically."""
+    cache = FakeCache()
+    monkeypatch.setattr(agent, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(agent, "scope_fingerprint", lambda state: "fp")
+    monkeypatch.setattr(agent, "embed_query", lambda question: np.ones(4, dtype=np.float32))
+    return cache
+
+
+def cached_entry(question, age_seconds, fingerprint="fp"):
+    return {
+        "question": question,
+        "embedding": (np.ones(4) / 2).tolist(),
+        "fingerprint": fingerprint,
+        "generation": f"answer to {question}",
+        "documents": [],
+        "created_at": time.time() - age_seconds,
+    }
+
+
+def test_expired_answer_is_not_served_even_if_scope_was_rewritten(cache, auditor):
+    state = {"question": "Who audits the company?"}
+    key = agent.answer_scope_key(state)
+    cache.values[key] = json.dumps([cached_entry("Who audits the company?", agent.ANSWER_CACHE_TTL_SECONDS + 60)])
+
+    assert auditor.check_cache(state) == {"cache_hit": False}
+
+
+def test_cache_answer_drops_expired_and_stale_entries(cache, auditor):
+    state = {"question": "What was total revenue?", "generation": "42", "documents": [{"text": "x"}]}
+    key = agent.answer_scope_key(state)
+    cache.values[key] = json.dumps([
+        cached_entry("old", agent.ANSWER_CACHE_TTL_SECONDS + 60),
+        cached_entry("stale filing", 60, fingerprint="other"),
+        cached_entry("fresh", 60),
+    ])
+
+    auditor.cache_answer(state)
+
+    assert [e["question"] for e in json.loads(cache.values[key])] == ["fresh", "What was total revenue?"]
+    assert auditor.check_cache({"question": "What was total revenue?"})["cache_hit"]
+
+
+def test_year_swapped_question_is_not_served_from_cache(cache, auditor):
+    state = {"question": "What was total revenue in 2022?"}
+    cache.values[agent.answer_scope_key(state)] = json.dumps([cached_entry("What was total revenue in 2022?", 60)])
+
+    assert auditor.check_cache({"question": "What was total revenue in 2023?"}) == {"cache_hit": False}
+    assert auditor.check_cache({"question": "what was total revenue in 2022"})["cache_hit"]
+
+
+def test_question_anchors_cover_numbers_and_names():
+    assert agent.question_anchors("What was total revenue in 2022?") == {"2022"}
+    assert agent.question_anchors("Who audits Apple Inc.?") == {"apple", "inc"}
+    assert agent.question_anchors("Net income of $1,250.5 million in Q3?") == {"1250.5", "q3", "3"}
+    assert agent.question_anchors("Who audits Apple?") != agent.question_anchors("Who audits Microsoft?")
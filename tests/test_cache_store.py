@@ -0,0 +1,61 @@
+import json
+import threading
+
+from cache_store import DiskLRUCache, LazyDiskCache
+
+
+def test_update_is_atomic_across_connections(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    caches = [DiskLRUCache(path, max_entries=10), DiskLRUCache(path, max_entries=10)]
+
+    def append(n):
+        return lambda current: json.dumps(json.loads(current or "[]") + [n])
+
+    threads = [threading.Thread(target=caches[n % 2].update, args=("k", append(n))) for n in range(40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(json.loads(caches[0].get("k"))) == list(range(40))
+
+
+def test_update_rolls_back_when_fn_raises(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    cache.put("k", "old")
+
+    def fail(current):
+        raise RuntimeError("boom")
+
+    try:
+        cache.update("k", fail)
+    except RuntimeError:
+        pass
+    assert cache.get("k") == "old"
+    cache.update("k", lambda current: current + "+new")
+    assert cache.get("k") == "old+new"
+
+
+def test_update_evicts_beyond_max_entries(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.update(key, lambda current: "v")
+    assert cache.stats()["entries"] == 2
+    assert cache.get("a") is None
+
+
+def test_lazy_cache_opens_one_shared_cache_on_first_use(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    lazy = LazyDiskCache(str(path), max_entries=10, ttl_seconds=60)
+    assert not path.exists()
+
+    opened = []
+    threads = [threading.Thread(target=lambda: opened.append(lazy.get())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert path.exists()
+    assert len({id(cache) for cache in opened}) == 1
+    assert opened[0].ttl_seconds == 60
@@ -0,0 +1,41 @@
+import random
+
+import agent
+
+
+def numeric_table(rows, seed=0):
+    rng = random.Random(seed)
+    cells = "".join(
+        f"<tr><td>Line item {r}</td>" + "".join(f"<td>{rng.randint(1000, 999999):,}</td>" for _ in range(4)) + "</tr>"
+        for r in range(rows)
+    )
+    return f"<table>{cells}</table>"
+
+
+def test_digits_and_separators_cost_a_token_each():
+    assert agent.estimate_tokens("1,234,567") == 7 + 1 # seven digits, two commas at CHARS_PER_TOKEN
+    assert agent.estimate_tokens("a\tb\nc") == 2 + 1
+    assert agent.estimate_tokens("") == 0
+
+
+def test_truncate_to_tokens_returns_longest_fitting_prefix():
+    text = "Revenue\t1,234\t5,678\nCost of sales\t910\t1,112\n"
+    for budget in range(agent.estimate_tokens(text) + 1):
+        prefix = agent.truncate_to_tokens(text, budget)
+        assert agent.estimate_tokens(prefix) <= budget
+        assert prefix == text or agent.estimate_tokens(text[:len(prefix) + 1]) > budget
+
+
+def test_pack_context_stays_within_budget_for_numeric_tables():
+    documents = [
+        {"text": f"Consolidated statement {i}", "page_number": i + 1, "table_json": numeric_table(60, seed=i), "_rerank_score": 1 - i / 10}
+        for i in range(4)
+    ]
+    budget = 1500
+
+    context, stats = agent.pack_context(documents, budget=budget)
+
+    assert stats["truncated"] == 1
+    assert stats["tokens"] <= budget
+    assert agent.estimate_tokens(context) <= budget
+    assert "[Source 1 - Page 1]" in context
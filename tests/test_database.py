@@ -0,0 +1,262 @@
+import sys
+import types
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+lancedb = pytest.importorskip("lancedb")
+
+import database
+from database import EMBEDDING_DIM
+
+
+def vector_column(n, dim=EMBEDDING_DIM, seed=0):
+    vectors = np.random.default_rng(seed).random((n, dim), dtype=np.float32)
+    return pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), dim), vectors
+
+
+def test_conform_batch_reorders_and_drops_extra_columns():
+    schema = pa.schema([pa.field("ticker", pa.string()), pa.field("year", pa.int64())])
+    batch = pa.RecordBatch.from_pydict({"year": [2023], "extra": ["x"], "ticker": ["GOOGL"]})
+
+    table = database.conform_batch(batch, schema)
+
+    assert table.schema == schema
+    assert table.to_pylist() == [{"ticker": "GOOGL", "year": 2023}]
+
+
+def test_conform_batch_names_missing_column():
+    schema = pa.schema([pa.field("ticker", pa.string()), pa.field("chunk_hash", pa.string())])
+    batch = pa.RecordBatch.from_pydict({"ticker": ["GOOGL"]})
+
+    with pytest.raises(ValueError, match="chunk_hash"):
+        database.conform_batch(batch, schema)
+
+
+def test_build_record_batch_matches_chunk_schema():
+    rows = [{name: "" for name in database.CHUNK_SCHEMA.names} for _ in range(2)]
+    for row in rows:
+        row.update(page_number=1, year=2023, risk_flag=False)
+    _, vectors = vector_column(2)
+
+    batch = database.build_record_batch(rows, vectors)
+
+    assert batch.schema.types == database.CHUNK_SCHEMA.types
+
+
+def test_delete_stale_chunks_matches_full_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "STALE_DELETE_BATCH", 2)
+    db = lancedb.connect(str(tmp_path))
+    rows = [
+        ("a.pdf", 1, "h1"),
+        ("a.pdf", 2, "h1"), # same content, different page: stale
+        ("a.pdf", 2, "h2"),
+        ("a.pdf", 3, ""), # legacy row without a hash: stale
+        ("a.pdf", 4, "h4"), # no longer produced: stale
+        ("b.pdf", 2, "h1"), # other filing: untouched
+    ]
+    vectors, _ = vector_column(len(rows))
+    tbl = db.create_table("chunks", data=pa.table({
+        "vector": vectors,
+        "source_pdf": [r[0] for r in rows],
+        "page_number": [r[1] for r in rows],
+        "chunk_hash": [r[2] for r in rows],
+    }))
+
+    removed = database._delete_stale_chunks(tbl, "a.pdf", {(1, "h1"), (2, "h2")})
+
+    assert removed == 3
+    left = tbl.to_arrow().select(["source_pdf", "page_number", "chunk_hash"]).to_pylist()
+    assert sorted(tuple(r.values()) for r in left) == [("a.pdf", 1, "h1"), ("a.pdf", 2, "h2"), ("b.pdf", 2, "h1")]
+    assert database._delete_stale_chunks(tbl, "a.pdf", {(1, "h1"), (2, "h2")}) == 0
+
+
+@pytest.fixture
+def without_pylance(monkeypatch):
+    """lancedb does not install pylance; any `import lance` now raises ImportError."""
+    monkeypatch.setitem(sys.modules, "lance", None)
+
+
+def test_ensure_scalar_indexes_updates_new_rows_incrementally(tmp_path, without_pylance):
+    db = lancedb.connect(str(tmp_path))
+
+    def rows(start, n):
+        vectors, _ = vector_column(n, seed=start)
+        return pa.table({
+            "vector": vectors,
+            "ticker": [f"T{i % 5}" for i in range(start, start + n)],
+            "year": [2020 + i % 4 for i in range(start, start + n)],
+        })
+
+    tbl = db.create_table("chunks", data=rows(0, 300))
+    assert database.ensure_scalar_indexes(tbl) == {"ticker": "built", "year": "built"}
+
+    tbl.add(rows(300, 50))
+    assert database.ensure_scalar_indexes(tbl) == {"ticker": "updated", "year": "updated"}
+    for column in ("ticker", "year"):
+        stats = tbl.index_stats(database._find_index(tbl, column).name)
+        assert stats.num_unindexed_rows == 0
+        assert stats.num_indexed_rows == 350
+
+    assert database.ensure_scalar_indexes(tbl) == {"ticker": "current", "year": "current"}
+
+
+def test_ensure_fts_indexes_updates_new_rows_incrementally(tmp_path, without_pylance):
+    db = lancedb.connect(str(tmp_path))
+
+    def rows(start, n):
+        vectors, _ = vector_column(n, seed=start)
+        return pa.table({"vector": vectors, "text": [f"revenue note {i}" for i in range(start, start + n)]})
+
+    tbl = db.create_table("chunks", data=rows(0, 20))
+    assert database.ensure_fts_indexes(tbl) == {"text": "built"}
+
+    tbl.add(rows(20, 5))
+    assert database.ensure_fts_indexes(tbl) == {"text": "updated"}
+    assert tbl.index_stats(database._find_index(tbl, "text").name).num_unindexed_rows == 0
+    assert len(tbl.search("revenue", query_type="fts").limit(100).to_list()) == 25
+
+
+def test_upsert_stream_merges_all_batches_in_one_version(tmp_path):
+    db = lancedb.connect(str(tmp_path))
+    schema = pa.schema([
+        pa.field("vector", pa.list_(pa.float32(), EMBEDDING_DIM)),
+        pa.field("source_pdf", pa.string()),
+        pa.field("page_number", pa.int64()),
+        pa.field("chunk_hash", pa.string()),
+    ])
+
+    def batches(hashes, seed):
+        for i in range(0, len(hashes), 2):
+            part = hashes[i:i + 2]
+            vectors, _ = vector_column(len(part), seed=seed + i)
+            yield pa.RecordBatch.from_arrays(
+                [vectors, pa.array(["a.pdf"] * len(part)), pa.array([1] * len(part), type=pa.int64()), pa.array(part)],
+                schema=schema,
+            )
+
+    tbl = database._upsert_stream(db, None, batches(["h0", "h1", "h2"], 0), schema, table_name="chunks")
+    assert tbl.count_rows() == 3
+    version = tbl.version
+
+    tbl = database._upsert_stream(db, tbl, batches(["h1", "h2", "h3", "h4", "h5"], 10), schema, table_name="chunks")
+
+    assert tbl.count_rows() == 6
+    assert tbl.version == version + 1
+    assert database._upsert_stream(db, tbl, iter([]), schema, table_name="chunks") is tbl
+    assert tbl.version == version + 1
+
+
+def test_delete_stale_chunks_skips_empty_source(tmp_path):
+    db = lancedb.connect(str(tmp_path))
+    vectors, _ = vector_column(2)
+    tbl = db.create_table("chunks", data=pa.table({
+        "vector": vectors,
+        "source_pdf": ["", ""],
+        "page_number": [1, 2],
+        "chunk_hash": ["h1", "h2"],
+    }))
+
+    assert database._delete_stale_chunks(tbl, "", {(1, "h1")}) == 0
+    assert tbl.count_rows() == 2
+
+
+class IndexedTable:
+    """Table stub whose vector index already covers every row, as after Table.optimize()."""
+
+    name = "chunks"
+
+    def __init__(self, num_rows):
+        self.num_rows = num_rows
+        self.trainings = []
+
+    def count_rows(self, where=None):
+        return self.num_rows
+
+    def list_indices(self):
+        return [types.SimpleNamespace(name="vector_idx", columns=["vector"])]
+
+    def index_stats(self, name):
+        return types.SimpleNamespace(num_indexed_rows=self.num_rows, num_unindexed_rows=0)
+
+    def create_index(self, **kwargs):
+        self.trainings.append(self.num_rows)
+
+
+def test_vector_index_retrains_on_growth_since_training(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "VECTOR_INDEX_STATE_PATH", str(tmp_path / "vector_index_state.json"))
+    tbl = IndexedTable(1000)
+    database.build_vector_index(tbl)
+
+    tbl.num_rows = 1200 # optimize() folded the new rows in: nothing is unindexed
+    assert database.ensure_vector_index(tbl, retrain_fraction=0.25) == "current"
+    tbl.num_rows = 1600
+    assert database.ensure_vector_index(tbl, retrain_fraction=0.25) == "retrained"
+    assert tbl.trainings == [1000, 1600]
+    assert database.ensure_vector_index(tbl, retrain_fraction=0.25) == "current"
+
+
+def test_vector_index_without_recorded_training_uses_current_coverage(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "VECTOR_INDEX_STATE_PATH", str(tmp_path / "vector_index_state.json"))
+    tbl = IndexedTable(1000)
+
+    assert database.ensure_vector_index(tbl, retrain_fraction=0.25) == "current"
+    tbl.num_rows = 1300
+    assert database.ensure_vector_index(tbl, retrain_fraction=0.25) == "retrained"
+
+
+def test_quantize_binary_packs_sign_bits():
+    vector = np.array([1.0, -1.0, 0.5, 0.0, -0.2, 3.0, 2.0, -4.0, 0.1] + [-1.0] * 7, dtype=np.float32)
+
+    assert database.quantize_binary(vector).tolist() == [0b10100110, 0b10000000]
+    assert database.quantize_binary(np.stack([vector, -vector])).shape == (2, 2)
+
+
+def binary_table(db, vectors, hashes, codes=True):
+    code_type = database.CHUNK_SCHEMA.field(database.BINARY_VECTOR_COLUMN).type
+    return db.create_table("chunks", data=pa.table({
+        "vector": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), EMBEDDING_DIM),
+        database.BINARY_VECTOR_COLUMN: database.binary_code_array(vectors) if codes else pa.nulls(len(hashes), code_type),
+        "source_pdf": ["a.pdf"] * len(hashes),
+        "page_number": list(range(len(hashes))),
+        "chunk_hash": hashes,
+    }))
+
+
+def test_two_stage_search_rescores_candidates_exactly(tmp_path):
+    db = lancedb.connect(str(tmp_path))
+    vectors = np.random.default_rng(0).standard_normal((200, EMBEDDING_DIM)).astype(np.float32)
+    tbl = binary_table(db, vectors, [f"h{i}" for i in range(200)])
+    query = vectors[7] + 0.01
+
+    found = database.two_stage_search(tbl, query, limit=5, oversample=10)
+
+    exact = ((vectors - query) ** 2).sum(axis=1)
+    assert found["chunk_hash"].tolist()[0] == "h7"
+    assert "vector" not in found.columns
+    assert np.allclose(found["_distance"], np.sort(exact[[int(h[1:]) for h in found["chunk_hash"]]]), rtol=1e-4)
+
+
+def test_two_stage_search_includes_rows_without_codes(tmp_path):
+    db = lancedb.connect(str(tmp_path))
+    vectors = np.random.default_rng(1).standard_normal((20, EMBEDDING_DIM)).astype(np.float32)
+    tbl = binary_table(db, vectors, [f"h{i}" for i in range(20)], codes=False)
+
+    found = database.two_stage_search(tbl, vectors[3], limit=3, oversample=4, include_uncoded=True)
+
+    assert found["chunk_hash"].tolist()[0] == "h3"
+
+
+def test_backfill_binary_codes_uses_stored_vectors(tmp_path):
+    db = lancedb.connect(str(tmp_path))
+    vectors = np.random.default_rng(2).standard_normal((5, EMBEDDING_DIM)).astype(np.float32)
+    tbl = binary_table(db, vectors, ["h0", "h1", "h2", "h3", ""], codes=False)
+
+    assert database.backfill_binary_codes(tbl, batch_size=2) == 4
+
+    rows = tbl.to_arrow().sort_by("page_number")
+    codes = rows[database.BINARY_VECTOR_COLUMN].to_pylist()
+    assert codes[:4] == database.quantize_binary(vectors[:4]).tolist()
+    assert codes[4] is None # legacy row without a hash: no unique key to merge on
+    assert database.backfill_binary_codes(tbl) == 0
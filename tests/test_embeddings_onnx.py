@@ -0,0 +1,99 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import embeddings
+
+SENTENCES = [
+    "Total net sales increased 8% compared to the prior fiscal year.",
+    "Item 1A. Risk Factors",
+    "Goodwill is tested for impairment at the reporting unit level at least annually.",
+    "Revenue from services is recognized ratably over the contract term.",
+]
+# Same per-text cosine floors as scripts/benchmark_embeddings.py
+PARITY_THRESHOLDS = {False: 0.999, True: 0.95}
+
+
+def cosine_rows(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def write_tiny_export(repo_dir, vocab, table, cls_pooling=False, normalize=True):
+    """A sentence-transformers style export whose 'transformer' just looks up token embeddings."""
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    os.makedirs(os.path.join(repo_dir, "onnx"))
+    os.makedirs(os.path.join(repo_dir, "1_Pooling"))
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"], axis=0)],
+        "tiny",
+        [
+            helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "seq"]),
+            helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "seq"]),
+        ],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "seq", table.shape[1]])],
+        initializer=[numpy_helper.from_array(table, "table")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, os.path.join(repo_dir, "onnx", "model.onnx"))
+
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.save(os.path.join(repo_dir, "tokenizer.json"))
+
+    modules = [{"type": "sentence_transformers.models.Transformer"}, {"type": "sentence_transformers.models.Pooling"}]
+    if normalize:
+        modules.append({"type": "sentence_transformers.models.Normalize"})
+    with open(os.path.join(repo_dir, "modules.json"), "w") as f:
+        json.dump(modules, f)
+    with open(os.path.join(repo_dir, "sentence_bert_config.json"), "w") as f:
+        json.dump({"max_seq_length": 16}, f)
+    with open(os.path.join(repo_dir, "1_Pooling", "config.json"), "w") as f:
+        json.dump({"word_embedding_dimension": table.shape[1], "pooling_mode_cls_token": cls_pooling}, f)
+
+
+@pytest.mark.parametrize("cls_pooling", [False, True])
+def test_onnx_encoder_pools_and_normalizes_like_sentence_transformers(tmp_path, monkeypatch, cls_pooling):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tokenizers")
+    words = sorted({w for s in SENTENCES for w in s.replace(".", " . ").replace("%", " % ").split()})
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{w: i + 2 for i, w in enumerate(words)}}
+    table = np.random.default_rng(0).normal(size=(len(vocab), 8)).astype(np.float32)
+    repo_dir = str(tmp_path / "tiny")
+    write_tiny_export(repo_dir, vocab, table, cls_pooling=cls_pooling)
+    monkeypatch.setattr(embeddings, "_download_sentence_transformer", lambda model_name: repo_dir)
+
+    encoder = embeddings.OnnxSentenceEncoder("tiny")
+    vectors = encoder.encode(SENTENCES, batch_size=3) # Second batch is padded differently from the first
+
+    expected = []
+    for sentence in SENTENCES:
+        ids = encoder.tokenizer.encode(sentence).ids
+        pooled = table[ids[0]] if cls_pooling else table[ids].mean(axis=0)
+        expected.append(pooled / np.linalg.norm(pooled))
+    assert vectors.shape == (len(SENTENCES), 8)
+    np.testing.assert_allclose(vectors, np.array(expected), atol=1e-5)
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_onnx_matches_sentence_transformer(tmp_path, monkeypatch, quantize):
+    pytest.importorskip("sentence_transformers")
+    pytest.importorskip("onnxruntime")
+    monkeypatch.setattr(embeddings, "ONNX_MODEL_DIR", str(tmp_path))
+    try:
+        reference = embeddings.get_embedding_model(backend="torch", quantize=False)
+        onnx_model = embeddings.get_embedding_model(backend="onnx", quantize=quantize)
+    except Exception as e:
+        pytest.skip(f"embedding model unavailable: {e}")
+
+    expected = np.asarray(reference.encode(SENTENCES, show_progress_bar=False), dtype=np.float32)
+    vectors = onnx_model.encode(SENTENCES)
+
+    assert cosine_rows(expected, vectors).min() >= PARITY_THRESHOLDS[quantize]
@@ -0,0 +1,49 @@
+import json
+
+import agent
+
+
+class CountingTable:
+    def __init__(self, rows_per_source):
+        self.rows_per_source = rows_per_source
+        self.queries = []
+        self.version = 1
+
+    def count_rows(self, where):
+        self.queries.append(where)
+        return next(n for source, n in self.rows_per_source.items() if f"'{source}'" in where)
+
+
+def write_manifest(tmp_path, monkeypatch, documents):
+    monkeypatch.setattr(agent, "_legacy_chunk_counts", {"version": None, "counts": {}})
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps({"documents": documents}))
+    monkeypatch.setattr(agent, "MANIFEST_PATH", str(path))
+
+
+DOCUMENTS = [
+    {"filename": "googl.pdf", "ticker": "GOOGL", "chunks": 100},
+    {"filename": "aapl.pdf", "ticker": "AAPL", "chunks": 300},
+    {"filename": "legacy.pdf", "ticker": "MSFT"}, # ingested before chunk counts were recorded
+]
+
+
+def test_selectivity_counts_legacy_entries_in_the_table(tmp_path, monkeypatch):
+    write_manifest(tmp_path, monkeypatch, DOCUMENTS)
+    table = CountingTable({"legacy.pdf": 600})
+
+    assert agent.estimate_selectivity({"ticker_filter": "MSFT"}, table) == 0.6
+    assert agent.estimate_selectivity({"ticker_filter": "GOOGL"}, table) == 0.1
+    assert table.queries == ["source_pdf = 'legacy.pdf'"] # memoized for the table version
+
+    table.version = 2 # a new ingest or delete committed
+    table.rows_per_source["legacy.pdf"] = 200
+    assert agent.estimate_selectivity({"ticker_filter": "MSFT"}, table) == 200 / 600
+    assert len(table.queries) == 2
+
+
+def test_selectivity_ignores_legacy_entries_without_a_table(tmp_path, monkeypatch):
+    write_manifest(tmp_path, monkeypatch, DOCUMENTS)
+
+    assert agent.estimate_selectivity({"ticker_filter": "GOOGL"}) == 0.25
+    assert agent.estimate_selectivity({"ticker_filter": "MSFT"}) == 0.0
@@ -0,0 +1,127 @@
+import random
+import time
+import types
+
+import pytest
+
+import agent
+from cache_store import DiskLRUCache
+
+
+class StubGrader:
+    """Stands in for grader_llm: answers from a callback on the prompt and records every call."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    def invoke(self, messages, max_tokens=None):
+        prompt = messages[0].content
+        self.prompts.append(prompt)
+        return types.SimpleNamespace(content=self.answer(prompt))
+
+
+def make_docs(texts):
+    return [{"text": t, "page_number": i + 1, "source_pdf": "a.pdf", "chunk_hash": f"h{i}"} for i, t in enumerate(texts)]
+
+
+@pytest.fixture
+def verdict_cache(tmp_path, monkeypatch):
+    cache = DiskLRUCache(str(tmp_path / "verdicts.sqlite"), max_entries=100)
+    monkeypatch.setattr(agent, "get_verdict_cache", lambda: cache)
+    return cache
+
+
+def grade_twice(monkeypatch, auditor, first, second):
+    """Grades the same chunks in mode first, then in mode second; returns the second grader's prompts."""
+    docs = make_docs(["auditor", "cafeteria"])
+    answers = {
+        "listwise": lambda prompt: "[1,1]",
+        "pointwise": lambda prompt: "NO" if "cafeteria" in prompt else "YES",
+    }
+    kept = {"listwise": ["auditor", "cafeteria"], "pointwise": ["auditor"]}
+    for mode in (first, second):
+        monkeypatch.setattr(agent, "GRADING_MODE", mode)
+        grader = StubGrader(answers[mode])
+        auditor.grader_llm = grader
+        result = auditor.grade_documents({"question": "Who is the auditor?", "documents": docs})["documents"]
+        assert [d["text"] for d in result] == kept[mode]
+
+    # Each mode reuses its own verdicts
+    auditor.grader_llm = StubGrader(lambda prompt: pytest.fail("cached verdict should be reused"))
+    for mode in (first, second):
+        monkeypatch.setattr(agent, "GRADING_MODE", mode)
+        result = auditor.grade_documents({"question": "Who is the auditor?", "documents": docs})["documents"]
+        assert [d["text"] for d in result] == kept[mode]
+    return grader.prompts
+
+
+def test_listwise_verdicts_do_not_answer_pointwise(monkeypatch, verdict_cache, auditor):
+    assert len(grade_twice(monkeypatch, auditor, "listwise", "pointwise")) == 2
+
+
+def test_pointwise_verdicts_do_not_answer_listwise(monkeypatch, verdict_cache, auditor):
+    assert len(grade_twice(monkeypatch, auditor, "pointwise", "listwise")) == 1
+
+
+def test_listwise_fallback_stores_verdicts_under_their_own_mode(monkeypatch, verdict_cache, auditor):
+    docs = make_docs(["auditor"])
+    monkeypatch.setattr(agent, "GRADING_MODE", "listwise")
+    auditor.grader_llm = StubGrader(lambda prompt: "not json" if "JSON array" in prompt else "YES")
+
+    auditor.grade_documents({"question": "Who is the auditor?", "documents": docs})
+
+    chunk = agent.chunk_id(docs[0])
+    modes = (agent.LISTWISE_FALLBACK_MODE, "pointwise", "listwise")
+    keys = [agent.verdict_key("Who is the auditor?", chunk, agent.grader_id(mode)) for mode in modes]
+    assert set(verdict_cache.get_many(keys)) == {keys[0]}
+
+
+def test_listwise_rerun_reuses_pointwise_fallback_verdicts(monkeypatch, verdict_cache, auditor):
+    docs = make_docs(["auditor", "cafeteria"])
+    monkeypatch.setattr(agent, "GRADING_MODE", "listwise")
+    grader = StubGrader(lambda prompt: "not json" if "JSON array" in prompt else ("NO" if "cafeteria" in prompt else "YES"))
+    auditor.grader_llm = grader
+    auditor.grade_documents({"question": "Who is the auditor?", "documents": docs})
+    assert len(grader.prompts) == 3 # one listwise call, then two pointwise
+
+    again = StubGrader(lambda prompt: pytest.fail("fallback verdicts should be reused"))
+    auditor.grader_llm = again
+    kept = auditor.grade_documents({"question": "Who is the auditor?", "documents": docs})["documents"]
+    assert [d["text"] for d in kept] == ["auditor"]
+
+
+def test_pointwise_verdicts_keep_retrieval_order(monkeypatch, auditor):
+    monkeypatch.setattr(agent, "get_verdict_cache", lambda: None)
+    monkeypatch.setattr(agent, "GRADING_MODE", "pointwise")
+    monkeypatch.setattr(agent, "GRADING_CONCURRENCY", 4)
+    texts = [f"chunk-{i:02d}" for i in range(12)]
+    delays = {t: random.Random(i).uniform(0, 0.05) for i, t in enumerate(texts)}
+
+    def answer(prompt):
+        text = next(t for t in texts if t in prompt)
+        time.sleep(delays[text])
+        return "YES" if int(text[-2:]) % 3 else "NO"
+
+    auditor.grader_llm = StubGrader(answer)
+    verdicts = auditor._grade_pointwise("q", make_docs(texts))
+
+    assert verdicts == [bool(i % 3) for i in range(12)]
+
+
+def test_failed_or_timed_out_grading_keeps_the_chunk(monkeypatch, auditor):
+    monkeypatch.setattr(agent, "get_verdict_cache", lambda: None)
+    monkeypatch.setattr(agent, "GRADING_MODE", "pointwise")
+
+    def answer(prompt):
+        if "slow" in prompt:
+            raise TimeoutError("Request timed out.")
+        if "broken" in prompt:
+            raise ConnectionError("server went away")
+        return "NO"
+
+    docs = make_docs(["irrelevant", "slow", "broken"])
+    auditor.grader_llm = StubGrader(answer)
+    kept = auditor.grade_documents({"question": "q", "documents": docs})["documents"]
+
+    assert [d["text"] for d in kept] == ["slow", "broken"]
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("unstructured")
+
+import ingest
+
+
+def test_plan_windows_splits_on_strategy_change_and_window_size():
+    strategies = ["fast", "fast", "hi_res", "hi_res", "hi_res", "fast"]
+
+    assert ingest.plan_windows(strategies, pages_per_window=2) == [
+        (0, 2, "fast"),
+        (2, 4, "hi_res"),
+        (4, 5, "hi_res"),
+        (5, 6, "fast"),
+    ]
+    assert ingest.plan_windows([]) == []
+
+
+def test_plan_windows_covers_every_page_once():
+    strategies = ["hi_res" if i % 7 == 0 else "fast" for i in range(30)]
+
+    windows = ingest.plan_windows(strategies, pages_per_window=4)
+
+    assert [page for start, end, _ in windows for page in range(start, end)] == list(range(30))
+    assert all(end - start <= 4 for start, end, _ in windows)
+    assert all(strategies[page] == strategy for start, end, strategy in windows for page in range(start, end))
+
+
+def test_table_likelihood_scores_numeric_heavy_lines():
+    table = "Revenue 2023 2022\nNet sales $383,285 $394,328\nGross margin 44.1% 43.3%\nTotal\n"
+    prose = "The Company designs smartphones.\n\nIt sells them worldwide in 2023.\n"
+
+    assert ingest._table_likelihood(table) == 0.75
+    assert ingest._table_likelihood(table) >= ingest.TRIAGE_TABLE_SCORE
+    assert ingest._table_likelihood(prose) == 0.0
+    assert ingest._table_likelihood("  \n\n") == 0.0
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("lancedb")
+
+import maintenance
+
+
+@pytest.fixture
+def lock_path(tmp_path, monkeypatch):
+    path = tmp_path / "maintenance.lock"
+    monkeypatch.setattr(maintenance, "LOCK_PATH", str(path))
+    return path
+
+
+def test_refresh_indexes_runs_under_lock(lock_path, monkeypatch):
+    seen = []
+    monkeypatch.setattr(maintenance, "maintain_indexes", lambda tbl: seen.append((tbl, lock_path.exists())))
+
+    assert maintenance.refresh_indexes(["chunks", "spans"]) is True
+    assert seen == [("chunks", True), ("spans", True)]
+    assert not lock_path.exists()
+
+
+def test_refresh_indexes_defers_to_running_pass(lock_path, monkeypatch):
+    seen = []
+    monkeypatch.setattr(maintenance, "maintain_indexes", seen.append)
+    assert maintenance._acquire_lock()
+
+    assert maintenance.refresh_indexes(["chunks"]) is False
+    assert seen == []
+    assert lock_path.exists()
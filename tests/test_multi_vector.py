@@ -0,0 +1,101 @@
+import re
+
+import pytest
+
+pytest.importorskip("lancedb")
+pd = pytest.importorskip("pandas")
+
+import agent
+import database
+import embeddings
+
+TEN_WORDS = " ".join(f"w{i}" for i in range(10))
+
+
+class WhitespaceModel:
+    """Stands in for a SentenceTransformer whose tokenizer yields one word piece per word."""
+
+    def tokenizer(self, text, add_special_tokens=False, return_offsets_mapping=True):
+        return {"offset_mapping": [(m.start(), m.end()) for m in re.finditer(r"\S+", text)]}
+
+
+@pytest.fixture
+def whitespace_model(monkeypatch):
+    monkeypatch.setattr(embeddings, "get_embedding_model", lambda model_name=None: WhitespaceModel())
+
+
+def test_token_windows_overlap_and_cover_the_text(whitespace_model):
+    assert embeddings.token_windows(TEN_WORDS, window=4, stride=3) == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    assert embeddings.token_windows("w0 w1 w2", window=4, stride=3) == ["w0 w1 w2"]
+
+
+def test_iter_span_rows_skips_the_first_window_and_copies_parent_keys(whitespace_model):
+    parent = {
+        "text": TEN_WORDS, "source_pdf": "a.pdf", "page_number": 3, "chunk_hash": "h3", "ticker": "GOOGL",
+        "industry": "Tech", "year": 2023, "filing_type": "10-K", "jurisdiction": "US", "risk_flag": False,
+        "section": "NarrativeText",
+    }
+    short = dict(parent, text="w0 w1", chunk_hash="h4")
+
+    spans = list(database.iter_span_rows([parent, short], window=4, stride=3))
+
+    assert [(s["span_index"], s["text"]) for s in spans] == [(1, "w3 w4 w5 w6"), (2, "w6 w7 w8 w9")]
+    assert all(s["chunk_hash"] == "h3" and s["ticker"] == "GOOGL" and s["year"] == 2023 for s in spans)
+    assert "section" not in spans[0]
+
+
+class SpanTable:
+    def __init__(self, spans):
+        self.spans = spans
+        self.where_clause = None
+
+    def search(self, query_vector):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def nprobes(self, n):
+        return self
+
+    def refine_factor(self, n):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def where(self, clause, prefilter=False):
+        self.where_clause = clause
+        return self
+
+    def to_pandas(self):
+        return pd.DataFrame(self.spans)
+
+
+def chunk(page, distance=None):
+    doc = {"source_pdf": "a.pdf", "page_number": page, "chunk_hash": f"h{page}", "text": f"p{page}"}
+    if distance is not None:
+        doc["_distance"] = distance
+    return doc
+
+
+def test_max_sim_scores_chunks_by_their_best_window(auditor, monkeypatch):
+    fetched = []
+
+    def fetch_chunks(keys, columns=None):
+        fetched.extend(keys)
+        return {key: chunk(key[1]) for key in keys}
+
+    monkeypatch.setattr(auditor, "_fetch_chunks", fetch_chunks)
+    spans = SpanTable([
+        dict(chunk(1), _distance=0.1, span_index=2), # beats the chunk's own vector
+        dict(chunk(2), _distance=0.9, span_index=1), # worse than the chunk's own vector
+        dict(chunk(3), _distance=0.2, span_index=1), # only reachable through a span
+    ])
+
+    docs = auditor._max_sim(spans, [0.0], [chunk(1, 0.5), chunk(2, 0.3)], limit=3, where_clause="ticker = 'A'", prefilter=True)
+
+    assert [(d["page_number"], d["_distance"], d["_span_index"]) for d in docs] == [(1, 0.1, 2), (3, 0.2, 1), (2, 0.3, 0)]
+    assert fetched == [("a.pdf", 3, "h3")]
+    assert spans.where_clause == "ticker = 'A'"
+    assert auditor._max_sim(spans, [0.0], [chunk(1, 0.5), chunk(2, 0.3)], limit=1, where_clause="", prefilter=False)[0]["page_number"] == 1
@@ -0,0 +1,135 @@
+import json
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import agent
+import embeddings
+
+
+class StubReranker:
+    def __init__(self, scores):
+        self.scores = scores
+
+    def predict(self, pairs, show_progress_bar=False):
+        return self.scores[:len(pairs)]
+
+
+def test_reranker_is_built_with_sigmoid_head(monkeypatch):
+    captured = {}
+
+    class Sigmoid:
+        pass
+
+    class CrossEncoder:
+        def __init__(self, model_name, **kwargs):
+            captured.update(kwargs)
+
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(nn=types.SimpleNamespace(Sigmoid=Sigmoid)))
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(CrossEncoder=CrossEncoder))
+    monkeypatch.setattr(embeddings, "_rerankers", {})
+
+    embeddings.get_reranker_model("stub-cross-encoder", backend="torch")
+    assert isinstance(captured.get("activation_fn"), Sigmoid)
+
+
+def write_tiny_cross_encoder(repo_dir, vocab, weights):
+    """A cross-encoder export whose 'classifier' sums one weight per token into a single logit."""
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    os.makedirs(os.path.join(repo_dir, "onnx"))
+    graph = helper.make_graph(
+        [
+            helper.make_node("Gather", ["weights", "input_ids"], ["token_logits"], axis=0),
+            helper.make_node("ReduceSum", ["token_logits", "axes"], ["logits"], keepdims=0),
+        ],
+        "tiny",
+        [
+            helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "seq"]),
+            helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "seq"]),
+        ],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch", 1])],
+        initializer=[numpy_helper.from_array(weights, "weights"), numpy_helper.from_array(np.array([1], dtype=np.int64), "axes")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, os.path.join(repo_dir, "onnx", "model.onnx"))
+
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.save(os.path.join(repo_dir, "tokenizer.json"))
+    with open(os.path.join(repo_dir, "config.json"), "w") as f:
+        json.dump({"max_position_embeddings": 16}, f)
+
+
+def test_onnx_cross_encoder_scores_pairs_with_sigmoid(tmp_path, monkeypatch):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("tokenizers")
+    pairs = [("who audits", "ernst young audits"), ("who audits", "cafeteria menu rotates weekly"), ("revenue", "revenue")]
+    words = sorted({w for pair in pairs for text in pair for w in text.split()})
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{w: i + 2 for i, w in enumerate(words)}}
+    weights = np.random.default_rng(0).normal(size=(len(vocab), 1)).astype(np.float32)
+    weights[0] = 0.0 # padding adds nothing to the logit
+    repo_dir = str(tmp_path / "tiny")
+    write_tiny_cross_encoder(repo_dir, vocab, weights)
+    monkeypatch.setattr(embeddings, "_download_cross_encoder", lambda model_name: repo_dir)
+
+    reranker = embeddings.OnnxCrossEncoder("tiny")
+    scores = reranker.predict(pairs, batch_size=2) # Second batch is padded differently from the first
+
+    logits = np.array([weights[reranker.tokenizer.encode(q, p).ids].sum() for q, p in pairs])
+    np.testing.assert_allclose(scores, 1.0 / (1.0 + np.exp(-logits)), atol=1e-5)
+
+
+def test_onnx_backend_reranker_does_not_import_torch(monkeypatch):
+    loaded = []
+
+    class OnnxCrossEncoder:
+        def __init__(self, model_name, **kwargs):
+            loaded.append(model_name)
+
+    monkeypatch.setitem(sys.modules, "torch", None) # any torch import now raises ImportError
+    monkeypatch.setattr(embeddings, "OnnxCrossEncoder", OnnxCrossEncoder)
+    monkeypatch.setattr(embeddings, "_rerankers", {})
+
+    model = embeddings.get_reranker_model("stub-cross-encoder", backend="onnx")
+    assert isinstance(model, OnnxCrossEncoder)
+    assert loaded == ["stub-cross-encoder"]
+
+
+def test_rerank_bands_probabilities(monkeypatch, auditor):
+    monkeypatch.setattr(agent, "RERANK_ENABLED", True)
+    monkeypatch.setattr(agent, "get_reranker_model", lambda: StubReranker([0.97, 0.5, 0.01]))
+    docs = [{"text": t, "page_number": i} for i, t in enumerate(["match", "maybe", "noise"])]
+
+    kept = auditor.rerank({"question": "Who audits the company?", "documents": docs})["documents"]
+
+    assert [(d["text"], d["_rerank_decision"]) for d in kept] == [("match", "accept"), ("maybe", "grade")]
+    assert all(0.0 <= d["_rerank_score"] <= 1.0 for d in kept)
+
+
+def test_real_reranker_scores_are_probabilities(monkeypatch, auditor):
+    pytest.importorskip("sentence_transformers")
+    try:
+        reranker = embeddings.get_reranker_model()
+    except Exception as e:
+        pytest.skip(f"reranker model unavailable: {e}")
+    monkeypatch.setattr(agent, "RERANK_ENABLED", True)
+    monkeypatch.setattr(agent, "RERANK_REJECT_SCORE", -1.0) # keep every chunk so all scores are visible
+    monkeypatch.setattr(agent, "get_reranker_model", lambda: reranker)
+    docs = [
+        {"text": "Ernst & Young LLP has served as the Company's independent auditor since 2009.", "page_number": 1},
+        {"text": "The cafeteria menu rotates weekly and includes vegetarian options.", "page_number": 2},
+    ]
+
+    kept = auditor.rerank({"question": "Who is the company's independent auditor?", "documents": docs})["documents"]
+
+    scores = [d["_rerank_score"] for d in kept]
+    assert len(scores) == 2
+    assert all(0.0 <= s <= 1.0 for s in scores)
+    assert scores[0] > 0.5 > scores[1]
@@ -0,0 +1,34 @@
+import agent
+
+
+def doc(page, text=None, **extra):
+    return {"source_pdf": "a.pdf", "page_number": page, "chunk_hash": f"h{page}", "text": text or f"p{page}", **extra}
+
+
+def test_rrf_fuse_rewards_chunks_found_by_both_legs():
+    vector = [doc(1), doc(2), doc(3)]
+    bm25 = [doc(3), doc(4)]
+
+    fused = agent.rrf_fuse([vector, bm25], k=60)
+
+    assert [d["page_number"] for d in fused] == [3, 1, 2, 4]
+    assert fused[0]["_relevance_score"] == 1 / 63 + 1 / 61
+    assert fused[1]["_relevance_score"] == 1 / 61
+
+
+def test_rrf_fuse_keeps_first_copy_and_does_not_mutate_inputs():
+    vector = [doc(1, _distance=0.2)]
+    bm25 = [doc(1, _score=7.5)]
+
+    fused = agent.rrf_fuse([vector, bm25])
+
+    assert len(fused) == 1
+    assert fused[0]["_distance"] == 0.2 and "_score" not in fused[0]
+    assert "_relevance_score" not in vector[0]
+
+
+def test_rrf_fuse_keys_legacy_rows_by_text():
+    legacy = [{"source_pdf": "a.pdf", "page_number": 1, "chunk_hash": "", "text": t} for t in ("x", "y")]
+
+    assert len(agent.rrf_fuse([legacy, legacy[::-1]])) == 2
+    assert agent.rrf_fuse([]) == []
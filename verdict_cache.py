@@ -0,0 +1,55 @@
+import os
+import hashlib
+from cache_store import LazyDiskCache
+from embeddings import normalize_text
+
+# Persistent relevance-grading verdicts keyed by (normalized question, chunk id, agent.grader_id).
+# A verdict is reusable across sessions, filter changes and reruns of the same question; entries
+# are tagged with their source filing so re-ingesting or deleting it drops them.
+# Set GRADING_CACHE=0 to disable.
+GRADING_CACHE_ENABLED = os.environ.get("GRADING_CACHE", "1") == "1"
+GRADING_CACHE_PATH = "data/cache/verdicts.sqlite"
+GRADING_CACHE_MAX_ENTRIES = 100_000
+GRADING_CACHE_TTL_SECONDS = float(os.environ.get("GRADING_CACHE_TTL_DAYS", "30")) * 24 * 3600
+
+_cache = LazyDiskCache(GRADING_CACHE_PATH, GRADING_CACHE_MAX_ENTRIES, ttl_seconds=GRADING_CACHE_TTL_SECONDS)
+
+def get_verdict_cache():
+    """
+    Returns the shared on-disk verdict cache (opened lazily), or None when disabled.
+    """
+    if not GRADING_CACHE_ENABLED:
+        return None
+    return _cache.get()
+
+def chunk_id(doc):
+    """
+    source_pdf:page:chunk_hash, or None for legacy rows without a content hash (never cached).
+    The hash changes with the chunk's content, so a replaced chunk never reuses an old verdict.
+    """
+    if not doc.get("chunk_hash"):
+        return None
+    return f"{doc.get('source_pdf', '')}:{int(doc.get('page_number', 0))}:{doc['chunk_hash']}"
+
+def verdict_key(question, chunk, grader_id):
+    question_hash = hashlib.sha256(normalize_text(question).lower().encode("utf-8")).hexdigest()
+    return f"{grader_id}\0{question_hash}\0{chunk}"
+
+def invalidate_source(source_pdf):
+    """
+    Drops every cached verdict for chunks of source_pdf. Returns the number removed.
+    """
+    cache = get_verdict_cache()
+    if cache is None:
+        return 0
+    removed = cache.invalidate_tag(source_pdf)
+    if removed:
+        print(f"Invalidated {removed} cached grading verdicts for {source_pdf}")
+    return removed
+
+def format_verdict_cache_stats():
+    cache = get_verdict_cache()
+    if cache is None:
+        return "Grading cache: disabled"
+    stats = cache.stats()
+    return f"Grading cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries"